@@ -1,14 +1,24 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 )
 from werkzeug.security import generate_password_hash, check_password_hash
-from db import get_db_connection
+from db import DeadlineExceeded, get_db_connection
+from sharding import connection_for_patient, fetch_all_patients
+from overload import limiter
+from profile_updates import stats as profile_update_stats
+from availability import availability_index
+from validation import validate_args, validate_json, ADMIN_CREATE, ID_QUERY, IMPORT_QUERY, LOGIN
+from bulk_import import KINDS as IMPORT_KINDS, import_rows, parse_rows
 
 admin_bp = Blueprint("admin", __name__)
 
 # --- Admin Signup (No Token Required) ---
 @admin_bp.route("/admin/create", methods=["POST"])
+@validate_json(ADMIN_CREATE)
 def admin_signup():
     data = request.get_json()
     full_name = data.get("full_name")
@@ -16,9 +26,6 @@ def admin_signup():
     password = data.get("password")
     role = data.get("role", "ADMIN")  # Default role is ADMIN
 
-    if not full_name or not email or not password:
-        return jsonify(error="Missing required fields"), 400
-
     hashed_password = generate_password_hash(password)
 
     conn = get_db_connection()
@@ -55,6 +62,8 @@ def admin_signup():
             }
         ), 201
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         conn.rollback()
         return jsonify(error=str(e)), 500
@@ -64,6 +73,7 @@ def admin_signup():
 
 # --- Admin Login (Returns JWT Token) ---
 @admin_bp.route("/admin/login", methods=["POST"])
+@validate_json(LOGIN)
 def admin_login():
     data = request.get_json()
     email = data.get("email")
@@ -104,11 +114,10 @@ def list_doctors():
 # --- View Doctors Details---
 @admin_bp.route("/admin/doctors/view", methods=["GET"])
 @jwt_required()
+@validate_args(ID_QUERY)
 def view_doctors():
     try:
-        doctor_id = request.args.get("id")  # Get ?id= from URL
-        if not doctor_id:
-            return jsonify(success=False, error="Doctor ID is required"), 400
+        doctor_id = request.args.get("id", type=int)  # Get ?id= from URL
 
         conn = get_db_connection()
         cur = conn.cursor(dictionary=True)
@@ -128,6 +137,8 @@ def view_doctors():
 
         return jsonify(success=True, data=doctor), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return jsonify(success=False, error="Failed to fetch doctor", details=str(e)), 500
 
@@ -135,13 +146,14 @@ def view_doctors():
 # --- View Patient Details ---
 @admin_bp.route("/admin/patient/view", methods=["GET"])
 @jwt_required()
+@validate_args(ID_QUERY)
 def view_patient():
     try:
-        patient_id = request.args.get("id")  # Get ?id= from URL
-        if not patient_id:
-            return jsonify(success=False, error="Patient ID is required"), 400
+        patient_id = request.args.get("id", type=int)  # Get ?id= from URL
 
-        conn = get_db_connection()
+        conn = connection_for_patient(patient_id)
+        if conn is None:
+            return jsonify(success=False, error="Patient not found"), 404
         cur = conn.cursor(dictionary=True)
         cur.execute("""
             SELECT id, full_name, email, mobile, date_of_birth, gender, blood_group,
@@ -156,6 +168,8 @@ def view_patient():
 
         return jsonify(success=True, data=patient), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return jsonify(success=False, error="Failed to fetch doctor", details=str(e)), 500
 
@@ -169,6 +183,7 @@ def approve_doctor(doc_id):
     cur.execute("UPDATE doctors SET approved=1 WHERE id=%s", (doc_id,))
     conn.commit()
     conn.close()
+    availability_index.update(doc_id, {"approved": True})
     return jsonify(message="Doctor approved"), 200
 
 
@@ -181,6 +196,7 @@ def reject_doctor(doc_id):
     cur.execute("UPDATE doctors SET approved=0 WHERE id=%s", (doc_id,))
     conn.commit()
     conn.close()
+    availability_index.update(doc_id, {"approved": False})
     return jsonify(message="Doctor rejected"), 200
 
 
@@ -188,19 +204,36 @@ def reject_doctor(doc_id):
 @admin_bp.route("/admin/patients", methods=["GET"])
 @jwt_required()
 def list_patients():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, full_name, email, mobile, is_active FROM patient")
-    patients = cur.fetchall()
-    conn.close()
+    patients = fetch_all_patients("SELECT id, full_name, email, mobile, is_active FROM patient ORDER BY id")
     return jsonify(patients), 200
 
 
+# --- Export Patients (CSV) ---
+@admin_bp.route("/admin/patients/export", methods=["GET"])
+@jwt_required()
+def export_patients():
+    patients = fetch_all_patients("""
+        SELECT id, full_name, email, mobile, gender, date_of_birth, blood_group,
+               city, state, zip, country, role, is_active, verified, created_at
+        FROM patient ORDER BY id
+    """)
+    columns = ["id", "full_name", "email", "mobile", "gender", "date_of_birth", "blood_group",
+               "city", "state", "zip", "country", "role", "is_active", "verified", "created_at"]
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(patients)
+    return Response(out.getvalue(), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=patients.csv"})
+
+
 # --- Deactivate Patient ---
 @admin_bp.route("/admin/patients/<int:pat_id>/deactivate", methods=["PUT"])
 @jwt_required()
 def deactivate_patient(pat_id):
-    conn = get_db_connection()
+    conn = connection_for_patient(pat_id)
+    if conn is None:
+        return jsonify(error="Patient not found"), 404
     cur = conn.cursor()
     cur.execute("UPDATE patient SET is_active=FALSE WHERE id=%s", (pat_id,))
     conn.commit()
@@ -210,7 +243,9 @@ def deactivate_patient(pat_id):
 @admin_bp.route("/admin/patients/<int:pat_id>/activate", methods=["PUT"])
 @jwt_required()
 def activate_patient(pat_id):
-    conn = get_db_connection()
+    conn = connection_for_patient(pat_id)
+    if conn is None:
+        return jsonify(error="Patient not found"), 404
     cur = conn.cursor()
     cur.execute("UPDATE patient SET is_active=TRUE WHERE id=%s", (pat_id,))
     conn.commit()
@@ -218,6 +253,52 @@ def activate_patient(pat_id):
     return jsonify(message="Patient activated"), 200
 
 
+# --- Bulk Import Doctors / Patients (CSV or NDJSON) ---
+# e.g. curl -X POST -H "Content-Type: text/csv" --data-binary @doctors.csv /admin/import/doctors
+@admin_bp.route("/admin/import/<kind>", methods=["POST"])
+@jwt_required()
+@validate_args(IMPORT_QUERY)
+def bulk_import(kind):
+    if kind not in IMPORT_KINDS:
+        return jsonify(error=f"Unknown import kind, use one of: {', '.join(sorted(IMPORT_KINDS))}"), 404
+
+    upload = request.files.get("file")
+    if upload:
+        text = upload.read().decode("utf-8-sig")
+        name = upload.filename or ""
+    else:
+        text = request.get_data(as_text=True)
+        name = ""
+
+    fmt = request.args.get("format")
+    if not fmt:
+        is_ndjson = "ndjson" in (request.mimetype or "") or name.endswith((".ndjson", ".jsonl"))
+        fmt = "ndjson" if is_ndjson else "csv"
+
+    try:
+        rows = parse_rows(text, fmt)
+        if not rows:
+            return jsonify(error="No rows to import"), 400
+        result = import_rows(kind, rows)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        return jsonify(error="Bulk import failed", details=str(e)), 500
+
+    if kind == "doctors" and result["summary"]["created"]:
+        availability_index.invalidate()
+    return jsonify(result), 200
+
+
+# --- Runtime Metrics ---
+@admin_bp.route("/admin/metrics", methods=["GET"])
+@jwt_required()
+def metrics():
+    return jsonify(admission=limiter.stats(), profile_writes=profile_update_stats()), 200
+
+
 @admin_bp.route("/api/admin/logout", methods=["POST"])
 @jwt_required()
 def admin_logout():
@@ -27,6 +27,10 @@ jwt = JWTManager(app)
 def check_if_token_revoked(jwt_header, jwt_payload):
     return jwt_payload['jti'] in blacklist
 
+# ✅ Request deadlines + load shedding (see overload.py)
+import overload
+overload.init_app(app)
+
 # ✅ Import and register blueprints AFTER declaring blacklist
 from doctor import doctor_bp
 from patient import patient_bp
@@ -0,0 +1,427 @@
+# availability.py
+"""In-memory weekly availability index for doctors.
+
+Every doctor gets a dense position ``p``. For each 15 minute slot of the week
+we keep one Python int whose bit ``p`` is set when that doctor is available
+during the whole slot, plus one bitmap per specialty, per city and one for
+approved (and not suspended) doctors. A query such as "approved cardiologists
+in Pune free on Tuesday 10:30-11:00" is then a handful of big-int ``&``
+operations, each of which runs over the whole doctor population at C speed.
+
+The index is filled lazily from the ``doctors`` table on first use, kept up to
+date by the write endpoints of this process and fully reloaded every
+``AVAILABILITY_INDEX_TTL`` seconds so that other workers' writes show up too.
+"""
+import datetime
+import os
+import re
+import threading
+import time
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+
+# Schedules shared by at least this many doctors are merged as one bitmap
+_GROUP_BITMAP_MIN = 64
+
+INDEX_TTL = int(os.environ.get("AVAILABILITY_INDEX_TTL", "300"))
+
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_DAY_ALIASES = {}
+for _i, _name in enumerate(DAY_NAMES):
+    for _alias in (_name, _name[:3], _name[:2]):
+        _DAY_ALIASES[_alias] = _i
+_DAY_ALIASES.update({"tues": 1, "thur": 3, "thurs": 3})
+
+_DAY_SPLIT_RE = re.compile(r"[,;/|\s]+")
+_DAY_RANGE_RE = re.compile(r"^([a-z]+)\s*(?:-|to)\s*([a-z]+)$")
+_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+
+# ---------------------------
+# Parsing helpers
+# ---------------------------
+def parse_day(value):
+    """Return the weekday index (Monday = 0) for a day name or abbreviation."""
+    day = _DAY_ALIASES.get(str(value).strip().lower())
+    if day is None:
+        raise ValueError(f"Unknown day: {value!r}")
+    return day
+
+
+def parse_days(value):
+    """Parse ``available_days`` ("Mon,Tue", "Monday Wednesday", "Mon-Fri", ...)."""
+    if not value:
+        return []
+    days = set()
+    text = str(value).strip().lower()
+    for part in re.split(r"\s*,\s*|\s*;\s*", text):
+        match = _DAY_RANGE_RE.match(part)
+        if match:
+            start, end = parse_day(match.group(1)), parse_day(match.group(2))
+            day = start
+            while True:
+                days.add(day)
+                if day == end:
+                    break
+                day = (day + 1) % 7
+            continue
+        for token in _DAY_SPLIT_RE.split(part):
+            if token:
+                days.add(parse_day(token))
+    return sorted(days)
+
+
+def parse_minutes(value):
+    """Return minutes since midnight for "HH:MM[:SS]", ``time`` or ``timedelta``."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    match = _TIME_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Invalid time: {value!r}")
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+        raise ValueError(f"Invalid time: {value!r}")
+    return hours * 60 + minutes
+
+
+def week_slots(available_days, available_from, available_to):
+    """Return the week slot numbers fully covered by a doctor's working hours.
+
+    A shift whose end is not after its start is treated as running past
+    midnight into the next day.
+    """
+    try:
+        days = parse_days(available_days)
+        start = parse_minutes(available_from)
+        end = parse_minutes(available_to)
+    except ValueError:
+        return []
+    if not days or start is None or end is None:
+        return []
+    if end <= start:
+        end += 24 * 60
+    first = -(-start // SLOT_MINUTES)
+    last = end // SLOT_MINUTES
+    slots = []
+    for day in days:
+        base = day * SLOTS_PER_DAY
+        slots.extend((base + slot) % SLOTS_PER_WEEK for slot in range(first, last))
+    return slots
+
+
+def _key(value):
+    return str(value).strip().lower() if value else None
+
+
+def _bitmap_from_positions(positions, size):
+    buf = bytearray((size + 7) // 8)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _positions_from_bitmap(bitmap, limit=None):
+    bits = format(bitmap, "b")[::-1]
+    positions = []
+    i = bits.find("1")
+    while i != -1 and (limit is None or len(positions) < limit):
+        positions.append(i)
+        i = bits.find("1", i + 1)
+    return positions
+
+
+# ---------------------------
+# Index
+# ---------------------------
+class AvailabilityIndex:
+    """Bitmap index answering "which doctors are free at time T" queries."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._pending = None
+        self._swap(self._empty_state())
+        self.loaded_at = None
+
+    @staticmethod
+    def _empty_state():
+        return {
+            "slots": [0] * SLOTS_PER_WEEK,
+            "specialty": {},
+            "city": {},
+            "approved": 0,
+            "positions": {},
+            "doctors": [],
+        }
+
+    def _swap(self, state):
+        self._slots = state["slots"]
+        self._specialty = state["specialty"]
+        self._city = state["city"]
+        self._approved = state["approved"]
+        self._positions = state["positions"]
+        self._doctors = state["doctors"]
+
+    # --- Loading ---
+    @classmethod
+    def _build(cls, rows):
+        """Build the state for ``doctors`` rows (dicts) without touching the live index.
+
+        Doctors sharing a schedule are grouped first, so each distinct
+        schedule is parsed once and large groups are ORed into their slots as
+        one bitmap instead of bit by bit.
+        """
+        state = cls._empty_state()
+        positions, doctors = state["positions"], state["doctors"]
+        schedules = {}
+        specialty_positions = {}
+        city_positions = {}
+        approved_positions = []
+        for row in rows:
+            pos = len(doctors)
+            schedule = (row.get("available_days"), row.get("available_from"), row.get("available_to"))
+            group = schedules.get(schedule)
+            if group is None:
+                group = schedules[schedule] = (week_slots(*schedule), [])
+            doctor = cls._record(row, group[0])
+            positions[doctor["id"]] = pos
+            doctors.append(doctor)
+            group[1].append(pos)
+            if doctor["specialty_key"]:
+                specialty_positions.setdefault(doctor["specialty_key"], []).append(pos)
+            if doctor["city_key"]:
+                city_positions.setdefault(doctor["city_key"], []).append(pos)
+            if doctor["is_listed"]:
+                approved_positions.append(pos)
+
+        size = len(doctors)
+        slot_positions = [[] for _ in range(SLOTS_PER_WEEK)]
+        slots = state["slots"]
+        for week, group_positions in schedules.values():
+            if len(group_positions) < _GROUP_BITMAP_MIN:
+                for slot in week:
+                    slot_positions[slot].extend(group_positions)
+                continue
+            bitmap = _bitmap_from_positions(group_positions, size)
+            for slot in week:
+                slots[slot] |= bitmap
+        for slot, slot_members in enumerate(slot_positions):
+            if slot_members:
+                slots[slot] |= _bitmap_from_positions(slot_members, size)
+
+        state["specialty"] = {k: _bitmap_from_positions(p, size) for k, p in specialty_positions.items()}
+        state["city"] = {k: _bitmap_from_positions(p, size) for k, p in city_positions.items()}
+        state["approved"] = _bitmap_from_positions(approved_positions, size)
+        return state
+
+    def load(self, rows):
+        """Rebuild the whole index from ``doctors`` rows (dicts)."""
+        state = self._build(rows)
+        with self._lock:
+            self._swap(state)
+            self.loaded_at = time.monotonic()
+
+    def _is_fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < INDEX_TTL
+
+    def ensure_loaded(self, loader):
+        """Load (or reload once the TTL expired) using ``loader()`` -> rows.
+
+        The rows are fetched and the new bitmaps built without holding the
+        index lock, so queries and writes keep using the current index in the
+        meantime. Writes made during the reload are replayed on the new index
+        when it is swapped in. Only a never loaded (or invalidated) index makes
+        callers wait for a reload another thread is running; a merely expired
+        one keeps being served until the new one is ready.
+        """
+        if self._is_fresh():
+            return
+        if not self._reload_lock.acquire(blocking=not self.is_loaded):
+            return
+        try:
+            if self._is_fresh():
+                return
+            with self._lock:
+                self._pending = []
+            try:
+                state = self._build(loader())
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._swap(state)
+                self.loaded_at = time.monotonic()
+                for name, args in pending:
+                    getattr(self, name)(*args)
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def __len__(self):
+        return len(self._positions)
+
+    @staticmethod
+    def _record(row, slots=None):
+        approved = bool(row.get("approved")) and not bool(row.get("suspended"))
+        return {
+            "id": int(row["id"]),
+            "full_name": row.get("full_name"),
+            "specialty": row.get("specialty"),
+            "city": row.get("city"),
+            "available_days": row.get("available_days"),
+            "available_from": row.get("available_from"),
+            "available_to": row.get("available_to"),
+            "approved": row.get("approved"),
+            "suspended": row.get("suspended"),
+            "specialty_key": _key(row.get("specialty")),
+            "city_key": _key(row.get("city")),
+            "slots": slots if slots is not None else week_slots(
+                row.get("available_days"), row.get("available_from"), row.get("available_to")
+            ),
+            "is_listed": approved,
+        }
+
+    # --- Incremental updates ---
+    def _defer(self, name, *args):
+        """Remember a write to replay on the index a running reload is building."""
+        if self._pending is not None:
+            self._pending.append((name, args))
+
+    def _unset(self, pos, doctor):
+        mask = ~(1 << pos)
+        for slot in doctor["slots"]:
+            self._slots[slot] &= mask
+        for bitmaps, key in ((self._specialty, doctor["specialty_key"]), (self._city, doctor["city_key"])):
+            if key in bitmaps:
+                bitmaps[key] &= mask
+                if not bitmaps[key]:
+                    del bitmaps[key]
+        self._approved &= mask
+
+    def _set(self, pos, doctor):
+        bit = 1 << pos
+        for slot in doctor["slots"]:
+            self._slots[slot] |= bit
+        if doctor["specialty_key"]:
+            self._specialty[doctor["specialty_key"]] = self._specialty.get(doctor["specialty_key"], 0) | bit
+        if doctor["city_key"]:
+            self._city[doctor["city_key"]] = self._city.get(doctor["city_key"], 0) | bit
+        if doctor["is_listed"]:
+            self._approved |= bit
+
+    def upsert(self, doctor_id, fields):
+        """Insert a doctor or merge ``fields`` into the existing entry.
+
+        Does nothing until the index has been loaded; the first query loads
+        the current state from the database anyway.
+        """
+        with self._lock:
+            self._defer("_upsert", doctor_id, fields)
+            self._upsert(doctor_id, fields)
+
+    def _upsert(self, doctor_id, fields):
+        if not self.is_loaded:
+            return
+        doctor_id = int(doctor_id)
+        pos = self._positions.get(doctor_id)
+        if pos is None:
+            row = dict(fields, id=doctor_id)
+            pos = len(self._doctors)
+            self._doctors.append(None)
+            self._positions[doctor_id] = pos
+        else:
+            current = self._doctors[pos]
+            self._unset(pos, current)
+            row = {k: current[k] for k in (
+                "full_name", "specialty", "city", "available_days",
+                "available_from", "available_to", "approved", "suspended"
+            )}
+            row.update(fields)
+            row["id"] = doctor_id
+        doctor = self._record(row)
+        self._doctors[pos] = doctor
+        self._set(pos, doctor)
+
+    def update(self, doctor_id, fields):
+        """Merge ``fields`` into a known doctor.
+
+        A doctor this process has never seen (e.g. registered through another
+        worker) cannot be patched from partial fields, so the index is marked
+        stale and rebuilt on the next query instead.
+        """
+        with self._lock:
+            self._defer("_update", doctor_id, fields)
+            self._update(doctor_id, fields)
+
+    def _update(self, doctor_id, fields):
+        if not self.is_loaded:
+            return
+        if int(doctor_id) not in self._positions:
+            self._invalidate()
+            return
+        self._upsert(doctor_id, fields)
+
+    def invalidate(self):
+        """Force a full reload on the next query (e.g. after a bulk import)."""
+        with self._lock:
+            self._defer("_invalidate")
+            self._invalidate()
+
+    def _invalidate(self):
+        self.loaded_at = None
+
+    # --- Queries ---
+    def available(self, day, start, end=None, specialty=None, city=None, limit=None):
+        """Return approved doctors free for the whole window ``[start, end)``.
+
+        ``day`` is a weekday index or name, ``start``/``end`` are minutes since
+        midnight or "HH:MM" strings; ``end`` defaults to one slot after start.
+        """
+        day = day if isinstance(day, int) else parse_day(day)
+        start = start if isinstance(start, int) else parse_minutes(start)
+        if end is None:
+            end = start + SLOT_MINUTES
+        elif not isinstance(end, int):
+            end = parse_minutes(end)
+        if end <= start:
+            end += 24 * 60
+
+        first = start // SLOT_MINUTES
+        last = -(-end // SLOT_MINUTES)
+        base = day * SLOTS_PER_DAY
+
+        with self._lock:
+            result = self._approved
+            if specialty:
+                result &= self._specialty.get(_key(specialty), 0)
+            if city:
+                result &= self._city.get(_key(city), 0)
+            for slot in range(first, last):
+                if not result:
+                    break
+                result &= self._slots[(base + slot) % SLOTS_PER_WEEK]
+            doctors = [self._doctors[pos] for pos in _positions_from_bitmap(result, limit)]
+
+        return [
+            {
+                "id": d["id"],
+                "full_name": d["full_name"],
+                "specialty": d["specialty"],
+                "city": d["city"],
+            }
+            for d in doctors
+        ]
+
+
+availability_index = AvailabilityIndex()
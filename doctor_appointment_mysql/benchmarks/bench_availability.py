@@ -0,0 +1,105 @@
+# benchmarks/bench_availability.py
+"""Benchmark the availability index against a naive scan at 100k doctors.
+
+Usage: python benchmarks/bench_availability.py [doctor_count]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import AvailabilityIndex, parse_days, parse_minutes  # noqa: E402
+
+SPECIALTIES = ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics",
+               "Psychiatry", "Oncology", "ENT", "Gynecology", "General Medicine"]
+CITIES = ["Pune", "Mumbai", "Delhi", "Bengaluru", "Chennai", "Hyderabad",
+          "Kolkata", "Ahmedabad", "Jaipur", "Lucknow"]
+DAY_PATTERNS = ["Mon-Fri", "Mon,Wed,Fri", "Tue,Thu,Sat", "Mon-Sat", "Sat,Sun", "Tue"]
+QUERIES = [
+    ("Tue", "10:30", None, "Cardiology", "Pune"),
+    ("Mon", "09:00", "12:00", None, "Mumbai"),
+    ("Sat", "18:15", None, "Pediatrics", None),
+    ("Fri", "14:00", "15:30", None, None),
+]
+
+
+def make_rows(count, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        start = rng.choice([7, 8, 9, 10, 12, 14, 16]) * 60 + rng.choice([0, 15, 30])
+        end = min(start + rng.choice([3, 4, 6, 8]) * 60, 23 * 60 + 45)
+        rows.append({
+            "id": i,
+            "full_name": f"Doctor {i}",
+            "specialty": rng.choice(SPECIALTIES),
+            "city": rng.choice(CITIES),
+            "available_days": rng.choice(DAY_PATTERNS),
+            "available_from": f"{start // 60:02d}:{start % 60:02d}",
+            "available_to": f"{end // 60:02d}:{end % 60:02d}",
+            "approved": rng.random() < 0.9,
+            "suspended": rng.random() < 0.02,
+        })
+    return rows
+
+
+def naive_available(rows, day, start, end, specialty, city):
+    """What an endpoint would do without the index: parse every row per query."""
+    day = parse_days(day)[0]
+    start = parse_minutes(start)
+    end = parse_minutes(end) if end else start + 15
+    found = []
+    for row in rows:
+        if not row["approved"] or row["suspended"]:
+            continue
+        if specialty and row["specialty"].lower() != specialty.lower():
+            continue
+        if city and row["city"].lower() != city.lower():
+            continue
+        if day not in parse_days(row["available_days"]):
+            continue
+        frm, to = parse_minutes(row["available_from"]), parse_minutes(row["available_to"])
+        if frm <= start and end <= to:
+            found.append(row["id"])
+    return found
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = make_rows(count)
+
+    index = AvailabilityIndex()
+    t0 = time.perf_counter()
+    index.load(rows)
+    print(f"doctors: {count}")
+    print(f"index build: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    for day, start, end, specialty, city in QUERIES:
+        label = f"{day} {start}{'-' + end if end else ''} specialty={specialty} city={city}"
+        hits = index.available(day, start, end, specialty=specialty, city=city)
+        fast = timeit(lambda: index.available(day, start, end, specialty=specialty, city=city), 20)
+        slow = timeit(lambda: naive_available(rows, day, start, end, specialty, city), 1)
+        expected = naive_available(rows, day, start, end, specialty, city)
+        assert [d["id"] for d in hits] == expected, label
+        print(f"{label}: {len(hits)} hits | index {fast * 1000:.2f} ms | scan {slow * 1000:.1f} ms"
+              f" | {slow / fast:.0f}x")
+
+    t0 = time.perf_counter()
+    for i in range(1, 1001):
+        index.update(i, {"available_days": "Sun", "available_from": "08:00", "available_to": "11:00"})
+    print(f"incremental update: {(time.perf_counter() - t0):.3f} ms/update")
+
+
+if __name__ == "__main__":
+    main()
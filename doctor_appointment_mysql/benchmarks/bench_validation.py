@@ -0,0 +1,83 @@
+# benchmarks/bench_validation.py
+"""Per-request validation cost for the register payloads.
+
+Compares the compiled schemas in validation.py with the hand-rolled checks
+patient.register used to run (uncompiled regex + strptime per call).
+
+Usage: python benchmarks/bench_validation.py [iterations]
+"""
+import datetime
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import DOCTOR_REGISTER, PATIENT_REGISTER  # noqa: E402
+
+PATIENT_OK = {
+    "fullName": "Asha Patil", "email": "asha@example.com", "password": "s3cret!!",
+    "mobile": "9876543210", "dateOfBirth": "1990-04-12", "gender": "female",
+    "bloodGroup": "O+", "city": "Pune", "state": "MH", "zip": "411001", "country": "India",
+}
+PATIENT_BAD = {
+    "fullName": "", "email": "not-an-email", "password": "123",
+    "dateOfBirth": "12/04/1990", "gender": "unknown", "role": "ADMIN",
+}
+DOCTOR_OK = {
+    "full_name": "Dr. Rao", "email": "rao@example.com", "password": "s3cret!!",
+    "mobile": "9876500000", "gender": "MALE", "location": "Pune",
+    "registration_number": "MH-12345", "council": "MMC", "degree": "MBBS, MD",
+    "specialty": "Cardiology", "experience": 12, "clinic_name": "Heart Care",
+    "clinic_address": "FC Road, Pune", "dob": "1980-01-01", "available_days": "Mon-Fri",
+    "available_from": "09:00", "available_to": "17:00", "city": "Pune",
+}
+DOCTOR_BAD = {"email": "rao@", "available_from": "9am", "dob": "1980-13-01"}
+
+
+def legacy_patient_checks(data):
+    """The checks patient.register used to run inline (first error only)."""
+    full_name, email = data.get("fullName"), data.get("email", "").lower()
+    password, mobile = data.get("password"), data.get("mobile")
+    if not all([full_name, email, password, mobile]):
+        return "Missing required fields"
+    if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        return "Invalid email format"
+    if len(password) < 6:
+        return "Password must be at least 6 characters long"
+    if data.get("dateOfBirth"):
+        try:
+            datetime.datetime.strptime(data["dateOfBirth"], "%Y-%m-%d")
+        except ValueError:
+            return "Invalid date format. Use YYYY-MM-DD"
+    if data.get("role", "PATIENT") not in ["PATIENT", "DOCTOR"]:
+        return "Invalid role"
+    gender = data.get("gender")
+    if gender and gender.upper() not in ["MALE", "FEMALE", "OTHER"]:
+        return "Invalid gender"
+
+
+def per_call_us(fn, payload, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    cases = [
+        ("patient register, valid", PATIENT_REGISTER.validate, PATIENT_OK),
+        ("patient register, invalid", PATIENT_REGISTER.validate, PATIENT_BAD),
+        ("doctor register, valid", DOCTOR_REGISTER.validate, DOCTOR_OK),
+        ("doctor register, invalid", DOCTOR_REGISTER.validate, DOCTOR_BAD),
+        ("legacy patient checks, valid", legacy_patient_checks, PATIENT_OK),
+    ]
+    for label, fn, payload in cases:
+        print(f"{label:32s} {per_call_us(fn, payload, iterations):6.2f} us/request")
+    print("errors reported for invalid doctor payload:", len(DOCTOR_REGISTER.validate(DOCTOR_BAD)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/chaos_overload.py
+"""Chaos benchmark: goodput with and without load shedding against a slow DB.
+
+Puts a TCP proxy in front of the local MySQL from db.DB_CONFIG that delays
+every server -> client packet, starts the app on a threaded local server,
+and drives it with more concurrent clients than the slowed database can
+serve. The run is repeated with LOAD_SHEDDING off and on. For each run it
+reports goodput (200s answered within the SLO per second), shed and
+timed-out responses, and /ping latency.
+
+Needs a reachable MySQL with the app schema (GET /admin/doctors is used as
+the DB-bound request). Usage:
+
+    python benchmarks/chaos_overload.py --delay-ms 200 --clients 64 --duration 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+# ---------------------------
+# Slow DB proxy
+# ---------------------------
+def start_delay_proxy(target_host, target_port, delay):
+    """Start a proxy delaying server -> client traffic by ``delay`` seconds; returns its port."""
+    ready = threading.Event()
+    state = {}
+
+    async def pipe(reader, writer, pause):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if pause:
+                    await asyncio.sleep(pause)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(target_host, target_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            pipe(client_reader, server_writer, 0),
+            pipe(server_reader, client_writer, delay),
+        )
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        state["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(main()), daemon=True).start()
+    ready.wait()
+    return state["port"]
+
+
+# ---------------------------
+# Load generation
+# ---------------------------
+def request(url, token=None, timeout=30):
+    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"} if token else {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def run_phase(base, token, clients, duration, slo):
+    results = []
+    pings = []
+    stop = time.monotonic() + duration
+    lock = threading.Lock()
+
+    def client():
+        while time.monotonic() < stop:
+            outcome = request(f"{base}/admin/doctors", token)
+            with lock:
+                results.append(outcome)
+            if outcome[0] == 503:
+                time.sleep(0.05)
+
+    def pinger():
+        while time.monotonic() < stop:
+            pings.append(request(f"{base}/ping")[1])
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)] + [threading.Thread(target=pinger)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    good = [lat for status, lat in results if status == 200 and lat <= slo]
+    ok_latencies = sorted(lat for status, lat in results if status == 200)
+    pings.sort()
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+    return {
+        "requests": len(results),
+        "goodput_rps": len(good) / duration,
+        "ok_p50_ms": pct(ok_latencies, 0.5),
+        "ok_p99_ms": pct(ok_latencies, 0.99),
+        "shed_503": sum(1 for s, _ in results if s == 503),
+        "timeout_504": sum(1 for s, _ in results if s == 504),
+        "errors": sum(1 for s, _ in results if s not in (200, 503, 504)),
+        "ping_p99_ms": pct(pings, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay-ms", type=float, default=200)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--slo-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    port = start_delay_proxy(db.DB_CONFIG["host"], db.DB_CONFIG["port"], args.delay_ms / 1000)
+    for config in [db.DB_CONFIG, *db.PATIENT_SHARDS]:
+        config.update(host="127.0.0.1", port=port)
+
+    from werkzeug.serving import make_server
+    from flask_jwt_extended import create_access_token
+    import app as application
+    import overload
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, application.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    with application.app.app_context():
+        token = create_access_token(identity="1")
+
+    print(f"DB delay {args.delay_ms:.0f} ms/packet, {args.clients} clients, {args.duration:.0f}s per phase, "
+          f"SLO {args.slo_ms:.0f} ms")
+    for shedding in (False, True):
+        application.app.config["LOAD_SHEDDING"] = shedding
+        overload.limiter.__init__()
+        stats = run_phase(base, token, args.clients, args.duration, args.slo_ms / 1000)
+        label = "shedding on " if shedding else "shedding off"
+        print(f"{label}: " + ", ".join(
+            f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()
+        ))
+        if shedding:
+            print("  limiter:", overload.limiter.stats())
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
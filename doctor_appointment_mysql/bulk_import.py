@@ -0,0 +1,385 @@
+# bulk_import.py
+"""Bulk onboarding of doctors and patients from CSV or NDJSON.
+
+Rows go through the same schemas as the register endpoints, then:
+
+* passwords are bcrypt-hashed in parallel on a process pool (rows migrated
+  from another system may instead carry an existing ``password_hash``);
+* rows are written with multi-row statements, one bounded transaction per
+  batch;
+* duplicate emails are rejected by the ``email`` unique key, not by a
+  per-row SELECT. Patients go through the shard directory (see sharding.py)
+  and are then written per shard. Doctors are written with
+  ``INSERT ... ON DUPLICATE KEY UPDATE id = id``, whose affected-row count
+  says how many rows were created; a batch mixing new and existing emails
+  is redone row by row to tell which is which.
+
+Passwords are hashed batch by batch, right before the batch is written. A
+batch that fails (bad data, lost connection...) marks its rows ``failed``
+and the import carries on; one that would overrun the request deadline is
+not started and its rows (and the rest) are reported ``skipped``. Either
+way the per-row report always comes back complete.
+
+Used by ``POST /admin/import/<kind>`` and from the command line::
+
+    python bulk_import.py doctors doctors.csv
+    python bulk_import.py patients patients.ndjson --format ndjson --report out.json
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from mysql.connector.constants import ClientFlag
+
+from db import DeadlineExceeded, get_db_connection, get_shard_connection, remaining_budget
+from sharding import allocate_many, release
+from validation import DOCTOR_REGISTER, PATIENT_REGISTER, Field, Schema
+
+BATCH_SIZE = int(os.environ.get("BULK_IMPORT_BATCH_SIZE", "500"))
+WORKERS = int(os.environ.get("BULK_IMPORT_WORKERS", "0")) or os.cpu_count() or 1
+MAX_ROWS = int(os.environ.get("BULK_IMPORT_MAX_ROWS", "100000"))
+# Start another batch only with this many times the slowest batch's duration left
+DEADLINE_MARGIN = 1.5
+
+BCRYPT_HASH_RE = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+def _password_optional(schema):
+    """Same schema, but ``password`` may be replaced by a ``password_hash``."""
+    fields = dict(schema.fields)
+    fields["password"] = Field("password", min_length=6)
+    fields["password_hash"] = Field("string")
+    return Schema(fields)
+
+
+# kind -> (schema, table, {column: row key}, defaults)
+KINDS = {
+    "patients": (
+        _password_optional(PATIENT_REGISTER),
+        "patient",
+        {
+            "full_name": "fullName", "email": "email", "mobile": "mobile", "gender": "gender",
+            "date_of_birth": "dateOfBirth", "blood_group": "bloodGroup", "address": "address",
+            "emergency_contact": "emergencyContact", "city": "city", "state": "state",
+            "zip": "zip", "country": "country", "allergies": "allergies",
+            "conditions": "conditions", "medications": "medications", "surgeries": "surgeries",
+            "emergency_contact_name": "emergencyContactName",
+            "emergency_contact_number": "emergencyContactNumber",
+            "document_path": "documentPath", "role": "role",
+        },
+        {"role": "PATIENT", "is_active": True, "verified": False},
+    ),
+    "doctors": (
+        _password_optional(DOCTOR_REGISTER),
+        "doctors",
+        {
+            name: name for name in (
+                "full_name", "email", "mobile", "gender", "location", "registration_number",
+                "council", "degree", "specialty", "experience", "clinic_name", "clinic_address",
+                "profile_photo", "role", "dob", "blood_group", "available_days",
+                "available_from", "available_to", "city", "state", "zip_code",
+                "languages", "status", "documents",
+            )
+        },
+        {"profile_photo": "", "role": "DOCTOR", "status": "ACTIVE", "documents": ""},
+    ),
+}
+
+
+# ---------------------------
+# Parsing
+# ---------------------------
+def parse_rows(text, fmt):
+    """Parse CSV (header row required) or NDJSON text into a list of dicts."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        return [{k.strip(): ((v.strip() or None) if isinstance(v, str) else v)
+                 for k, v in row.items() if k} for row in reader]
+    if fmt == "ndjson":
+        rows = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append({"_error": f"line {line_no}: {e}"})
+        return rows
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+# ---------------------------
+# Hashing
+# ---------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork: the importing process is a threaded web worker
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+        return _pool
+
+
+def _hash_password(password):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def hash_passwords(passwords):
+    if not passwords:
+        return []
+    if WORKERS == 1 or len(passwords) == 1:
+        return [_hash_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (WORKERS * 4))
+    return list(_get_pool().map(_hash_password, passwords, chunksize=chunksize))
+
+
+# ---------------------------
+# Import
+# ---------------------------
+def _insert_batch(table, columns, batch):
+    """Insert ``batch`` [(report_entry, values)] and mark each entry created/duplicate."""
+    email_at = columns.index("email")
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ", NOW(), NOW())"
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}, created_at, updated_at) VALUES "
+    upsert_sql = " ON DUPLICATE KEY UPDATE id = id"
+
+    # Without FOUND_ROWS a no-op duplicate counts 0 affected rows, a new row 1
+    conn = get_db_connection(client_flags=[-ClientFlag.FOUND_ROWS])
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            insert_sql + ", ".join([row_sql] * len(batch)) + upsert_sql,
+            [v for _, values in batch for v in values],
+        )
+        if cur.rowcount == len(batch):
+            emails = [values[email_at] for _, values in batch]
+            cur.execute(
+                f"SELECT id, email FROM {table} WHERE email IN ({', '.join(['%s'] * len(emails))})",
+                emails,
+            )
+            ids = {email.lower(): row_id for row_id, email in cur.fetchall()}
+            conn.commit()
+            for entry, values in batch:
+                entry.update(status="created", id=ids.get(values[email_at].lower()))
+            return
+        if cur.rowcount == 0:
+            conn.commit()
+            for entry, _ in batch:
+                entry.update(status="duplicate", error="Email already registered")
+            return
+
+        # New and existing emails mixed: redo the batch one row at a time
+        conn.rollback()
+        outcomes = []
+        for entry, values in batch:
+            cur.execute(insert_sql + row_sql + upsert_sql, values)
+            outcomes.append((entry, cur.rowcount == 1, cur.lastrowid))
+        conn.commit()
+        for entry, created, row_id in outcomes:
+            if created:
+                entry.update(status="created", id=row_id)
+            else:
+                entry.update(status="duplicate", error="Email already registered")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _insert_patient_batch(columns, batch):
+    """Sharded variant of ``_insert_batch`` for patients.
+
+    The patient directory allocates ids (and rejects existing emails through
+    its unique key) for the whole batch in one statement; rows are then
+    written with one multi-row INSERT per shard. A shard that fails only
+    fails its own rows, whose directory ids are released again.
+    """
+    email_at = columns.index("email")
+    allocated = allocate_many([values[email_at] for _, values in batch])
+
+    by_shard = {}
+    for entry, values in batch:
+        placement = allocated.get(values[email_at])
+        if placement is None:
+            entry.update(status="duplicate", error="Email already registered")
+            continue
+        patient_id, shard = placement
+        by_shard.setdefault(shard, []).append((entry, patient_id, values))
+
+    unwritten = []
+    written = set()
+    placeholders = "(" + ", ".join(["%s"] * (len(columns) + 1)) + ", NOW(), NOW())"
+    try:
+        for shard, rows in by_shard.items():
+            try:
+                conn = get_shard_connection(shard)
+                try:
+                    cur = conn.cursor()
+                    cur.execute(
+                        f"INSERT INTO patient (id, {', '.join(columns)}, created_at, updated_at) "
+                        f"VALUES {', '.join([placeholders] * len(rows))}",
+                        [v for _, patient_id, values in rows for v in [patient_id, *values]],
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except DeadlineExceeded:
+                # Out of time: this shard's rows and the shards after it are skipped
+                unwritten.extend(patient_id for rows in by_shard.values() for _, patient_id, _ in rows
+                                 if patient_id not in written)
+                raise
+            except Exception as e:
+                logging.exception("Bulk import: patient batch failed on shard %s", shard)
+                for entry, patient_id, _ in rows:
+                    entry.update(status="failed", error=str(e))
+                    unwritten.append(patient_id)
+                continue
+            for entry, patient_id, _ in rows:
+                entry.update(status="created", id=patient_id)
+                written.add(patient_id)
+    finally:
+        release(sorted(unwritten))
+
+
+def _skip(pending):
+    for entry, _ in pending:
+        if "status" not in entry:
+            entry.update(status="skipped", error="Import ran out of time before this row; submit it again")
+
+
+def import_rows(kind, rows, batch_size=BATCH_SIZE):
+    """Validate, hash and insert ``rows``; returns the per-row report.
+
+    Under a request deadline (the HTTP endpoint), batches that would not
+    finish in time are not started and their rows are reported ``skipped``.
+    Re-submitting the same file is safe: rows already written come back as
+    duplicates.
+    """
+    schema, table, mapping, defaults = KINDS[kind]
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"At most {MAX_ROWS} rows per import")
+
+    started = time.perf_counter()
+    report = [{"row": i} for i in range(1, len(rows) + 1)]
+    columns = list(mapping) + [c for c in defaults if c not in mapping] + ["password"]
+    seen = set()
+    pending = []  # (report entry, row)
+
+    for entry, row in zip(report, rows):
+        if not isinstance(row, dict):
+            entry.update(status="invalid", errors={"_payload": "must be an object"})
+            continue
+        if "_error" in row:
+            entry.update(status="invalid", errors={"_payload": row["_error"]})
+            continue
+        errors = schema.validate(row)
+        if not row.get("password") and not row.get("password_hash"):
+            errors["password"] = "is required"
+        elif row.get("password_hash") and not BCRYPT_HASH_RE.match(str(row["password_hash"])):
+            errors["password_hash"] = "must be a bcrypt hash"
+        if errors:
+            entry.update(status="invalid", errors=errors)
+            continue
+        email = str(row["email"]).lower()
+        if email in seen:
+            entry.update(status="duplicate", error="Email repeated in this file")
+            continue
+        seen.add(email)
+        pending.append((entry, row))
+
+    def prepare(entry, row, password_hash):
+        values = []
+        for column in columns[:-1]:
+            key = mapping.get(column)
+            value = row.get(key) if key else None
+            if value is None:
+                value = defaults.get(column)
+            if column == "email" and kind == "patients":
+                value = value.lower()
+            values.append(value)
+        values.append(password_hash)
+        return entry, values
+
+    # Hash and write one batch at a time, so an import that runs out of
+    # request time stops between batches with everything before it written
+    slowest = 0.0
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        remaining = remaining_budget()
+        if remaining is not None and remaining < slowest * DEADLINE_MARGIN:
+            _skip(pending[start:])
+            break
+
+        batch_started = time.perf_counter()
+        try:
+            hashes = iter(hash_passwords([row["password"] for _, row in chunk if not row.get("password_hash")]))
+            batch = [prepare(entry, row, row.get("password_hash") or next(hashes)) for entry, row in chunk]
+            if kind == "patients":
+                _insert_patient_batch(columns, batch)
+            else:
+                _insert_batch(table, columns, batch)
+        except DeadlineExceeded:
+            _skip(pending[start:])
+            break
+        except Exception as e:
+            logging.exception("Bulk import: %s batch starting at row %s failed", kind, chunk[0][0]["row"])
+            for entry, _ in chunk:
+                if "status" not in entry:
+                    entry.update(status="failed", error=str(e))
+        slowest = max(slowest, time.perf_counter() - batch_started)
+
+    elapsed = time.perf_counter() - started
+    summary = {status: sum(1 for e in report if e["status"] == status)
+               for status in ("created", "duplicate", "invalid", "failed", "skipped")}
+    summary.update(total=len(rows), seconds=round(elapsed, 3),
+                   rows_per_second=round(len(rows) / elapsed, 1) if elapsed else None)
+    return {"summary": summary, "rows": report}
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import doctors or patients")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("path", help="CSV or NDJSON file, '-' for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"],
+                        help="defaults to the file extension (csv unless .ndjson/.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--report", help="write the per-row report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.path, encoding="utf-8-sig") as f:
+            text = f.read()
+
+    result = import_rows(args.kind, parse_rows(text, fmt), batch_size=args.batch_size)
+    print(json.dumps(result["summary"]))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+    return 0 if result["summary"]["invalid"] == result["summary"]["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
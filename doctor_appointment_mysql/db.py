@@ -1,4 +1,13 @@
 # db.py
+import contextlib
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import weakref
+
 import mysql.connector
 
 DB_CONFIG = {
@@ -9,5 +18,183 @@ DB_CONFIG = {
     "database": "doctorapp"
 }
 
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+# Patient shards: a JSON list of overrides applied on top of DB_CONFIG, e.g.
+# PATIENT_SHARDS='[{"database": "doctorapp_p0"}, {"database": "doctorapp_p1"}]'
+# or separate servers with "host"/"port". Defaults to a single shard, the main DB.
+# setup_shards.py creates these databases and their patient table.
+PATIENT_SHARDS = [
+    dict(DB_CONFIG, **overrides)
+    for overrides in json.loads(os.environ.get("PATIENT_SHARDS", "[{}]"))
+]
+
+# Upper bound on connections one worker process holds open at a time; callers
+# beyond it wait for a slot, but never past their request deadline.
+MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "32"))
+WAIT_HALF_LIFE = 1.0
+
+# Absolute time.monotonic() by which the current request must finish (None = no limit)
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+_wait_lock = threading.Lock()
+_wait_ewma = 0.0
+_wait_updated = time.monotonic()
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before (or while) getting a DB connection."""
+
+
+def remaining_budget():
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def fresh_deadline(seconds):
+    """Give the enclosed block its own ``seconds`` budget instead of the request's.
+
+    For bookkeeping that must still run once the request itself is out of
+    time, e.g. recording the outcome of a write that already committed.
+    """
+    token = request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def connection_wait_ewma():
+    """Smoothed time (seconds) recent callers waited for a connection slot.
+
+    Decays with a one second half-life, so the signal fades once callers stop
+    queueing (e.g. because they are being shed).
+    """
+    with _wait_lock:
+        return _wait_ewma * 0.5 ** ((time.monotonic() - _wait_updated) / WAIT_HALF_LIFE)
+
+
+def _record_wait(seconds):
+    global _wait_ewma, _wait_updated
+    with _wait_lock:
+        now = time.monotonic()
+        decayed = _wait_ewma * 0.5 ** ((now - _wait_updated) / WAIT_HALF_LIFE)
+        _wait_ewma = 0.8 * decayed + 0.2 * seconds
+        _wait_updated = now
+
+
+# MySQL's "maximum statement execution time exceeded" (MAX_EXECUTION_TIME)
+ER_QUERY_TIMEOUT = 3024
+
+
+def _checked(call, *args, **kwargs):
+    """Run a driver call, reporting failures caused by the deadline as DeadlineExceeded."""
+    try:
+        return call(*args, **kwargs)
+    except mysql.connector.Error as e:
+        remaining = remaining_budget()
+        if e.errno == ER_QUERY_TIMEOUT or (remaining is not None and remaining <= 0):
+            raise DeadlineExceeded("Request deadline exceeded during a database call") from e
+        raise
+
+
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, *args, **kwargs):
+        return _checked(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return _checked(self._cursor.executemany, *args, **kwargs)
+
+    def fetchone(self):
+        return _checked(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return _checked(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return _checked(self._cursor.fetchall)
+
+
+class _Connection:
+    """A connection holding one of the worker's slots until it is closed.
+
+    If a handler forgets ``close()`` the slot is still returned when the
+    object is garbage collected. Driver errors caused by the request deadline
+    (the query time limit or the socket timeout firing) surface as
+    ``DeadlineExceeded`` so handlers can tell them from real failures.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._release = weakref.finalize(self, _slots.release)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return _Cursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        return _checked(self._conn.commit)
+
+    def close(self):
+        try:
+            self._conn.close()
+        finally:
+            self._release()
+
+
+def _connect(config):
+    remaining = remaining_budget()
+    started = time.monotonic()
+    if remaining is None:
+        _slots.acquire()
+        _record_wait(time.monotonic() - started)
+        try:
+            return _Connection(mysql.connector.connect(**config))
+        except Exception:
+            _slots.release()
+            raise
+
+    if remaining <= 0 or not _slots.acquire(timeout=remaining):
+        _record_wait(time.monotonic() - started)
+        raise DeadlineExceeded("Request deadline exceeded while waiting for a database connection")
+    _record_wait(time.monotonic() - started)
+
+    remaining = remaining_budget()
+    if remaining <= 0:
+        _slots.release()
+        raise DeadlineExceeded("Request deadline exceeded while waiting for a database connection")
+    try:
+        # The socket timeout bounds connect and every read; MAX_EXECUTION_TIME
+        # makes MySQL itself abandon SELECTs that would outlive the request.
+        conn = mysql.connector.connect(
+            **config,
+            connection_timeout=max(1, math.ceil(remaining)),
+            init_command=f"SET SESSION MAX_EXECUTION_TIME = {max(1, int(remaining * 1000))}",
+        )
+    except Exception:
+        _slots.release()
+        raise
+    return _Connection(conn)
+
+
+def get_db_connection(**options):
+    """Connection to the main database; ``options`` override DB_CONFIG entries."""
+    return _connect(dict(DB_CONFIG, **options))
+
+
+def get_shard_connection(shard):
+    return _connect(PATIENT_SHARDS[shard])
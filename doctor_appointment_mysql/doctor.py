@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
+from db import DeadlineExceeded, get_db_connection
+from idempotency import idempotent
+from validation import validate_json, validate_args, DOCTOR_REGISTER, DOCTOR_UPDATE, LOGIN, AVAILABILITY_QUERY
+from availability import availability_index, parse_day, parse_minutes
+from profile_updates import save_profile, parse_version, CONFLICT, NOT_FOUND, UNCHANGED
 import bcrypt
 import datetime
 import os
@@ -13,15 +17,43 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "your_dev_secret")
 
 doctor_bp = Blueprint("doctor", __name__, url_prefix="/api/doctor")
 
+# Columns mirrored by the in-memory availability index
+INDEXED_FIELDS = [
+    "full_name", "specialty", "city", "available_days", "available_from", "available_to"
+]
+
+
+def load_availability_rows():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT id, full_name, specialty, city, available_days,
+               available_from, available_to, approved, suspended
+        FROM doctors
+    """)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
 
 # REGISTER
 @doctor_bp.route("/register", methods=["POST"])
+@validate_json(DOCTOR_REGISTER)
+@idempotent("doctor.register")
 def register():
     data = request.get_json()
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
+        # Check duplicates before paying for the bcrypt hash
+        cursor.execute("SELECT id FROM doctors WHERE email = %s", (data["email"],))
+        if cursor.fetchone():
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Email already registered"}), 409
+
         hashed_password = bcrypt.hashpw(data["password"].encode("utf-8"), bcrypt.gensalt())
 
         query = """
@@ -75,6 +107,17 @@ def register():
         cursor.close()
         conn.close()
 
+        availability_index.upsert(doctor_id, {
+            "full_name": doctor_data["full_name"],
+            "specialty": doctor_data["specialty"],
+            "city": doctor_data["city"],
+            "available_days": doctor_data["available_days"],
+            "available_from": doctor_data["available_from"],
+            "available_to": doctor_data["available_to"],
+            "approved": False,
+            "suspended": False
+        })
+
         access_token = create_access_token(
             identity=str(doctor_id),
             additional_claims={"role": "DOCTOR"},
@@ -92,6 +135,8 @@ def register():
             }
         }), 201
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Registration failed", "details": str(e)}), 400
@@ -99,6 +144,7 @@ def register():
 
 # LOGIN
 @doctor_bp.route("/login", methods=["POST"])
+@validate_json(LOGIN)
 def login():
     data = request.get_json()
     try:
@@ -133,6 +179,8 @@ def login():
         conn.close()
         return jsonify({"error": "Invalid credentials"}), 401
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Login failed", "details": str(e)}), 400
@@ -177,20 +225,21 @@ def get_profile():
 
         return jsonify(doctor), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Failed to fetch profile", "details": str(e)}), 500
 
 @doctor_bp.route("/profile/update", methods=["PUT"])
 @jwt_required()
+@validate_json(DOCTOR_UPDATE)
+@idempotent("doctor.profile.update")
 def update_profile():
     try:
         doctor_id = int(get_jwt_identity())
         data = request.get_json()
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
         fields = [
             "full_name", "email", "mobile", "gender", "location", "registration_number",
             "council", "degree", "specialty", "experience", "clinic_name", "clinic_address",
@@ -198,31 +247,67 @@ def update_profile():
             "available_to", "city", "state", "zip_code", "languages", "status", "documents"
         ]
 
-        updates = []
-        values = []
-
-        for field in fields:
-            if field in data:
-                updates.append(f"{field} = %s")
-                values.append(data[field])
-
-        if not updates:
+        incoming = {field: data[field] for field in fields if field in data}
+        if not incoming:
             return jsonify({"error": "No fields to update"}), 400
 
-        values.append(doctor_id)
+        conn = get_db_connection()
+        try:
+            status, changes, current_version = save_profile(
+                conn, "doctors", doctor_id, incoming,
+                version=parse_version(data.get("updated_at"))
+            )
+        finally:
+            conn.close()
+
+        if status == NOT_FOUND:
+            return jsonify({"error": "Doctor not found"}), 404
+        if status == CONFLICT:
+            return jsonify({
+                "error": "Profile was changed elsewhere. Reload it and try again.",
+                "updated_at": current_version
+            }), 409
+        if status == UNCHANGED:
+            return jsonify({"message": "Profile unchanged", "unchanged": True}), 200
 
-        query = f"""
-            UPDATE doctors SET {', '.join(updates)}, updated_at = NOW()
-            WHERE id = %s
-        """
-        cursor.execute(query, tuple(values))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        indexed = {field: changes[field] for field in INDEXED_FIELDS if field in changes}
+        if indexed:
+            availability_index.update(doctor_id, indexed)
 
         return jsonify({"message": "Profile updated successfully"}), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Profile update failed", "details": str(e)}), 500
 
+
+# AVAILABLE DOCTORS
+# e.g. /api/doctor/available?day=Tue&time=10:30&until=11:00&specialty=Cardiology&city=Pune
+@doctor_bp.route("/available", methods=["GET"])
+@validate_args(AVAILABILITY_QUERY)
+def available_doctors():
+    try:
+        day = parse_day(request.args["day"])
+        start = parse_minutes(request.args["time"])
+        end = parse_minutes(request.args["until"]) if request.args.get("until") else None
+        limit = request.args.get("limit", type=int)
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": "Invalid availability query", "details": str(e)}), 400
+
+    try:
+        availability_index.ensure_loaded(load_availability_rows)
+        doctors = availability_index.available(
+            day, start, end,
+            specialty=request.args.get("specialty"),
+            city=request.args.get("city"),
+            limit=limit
+        )
+        return jsonify({"count": len(doctors), "doctors": doctors}), 200
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Failed to search availability", "details": str(e)}), 500
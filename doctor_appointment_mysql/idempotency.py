@@ -0,0 +1,360 @@
+# idempotency.py
+"""``Idempotency-Key`` support for write endpoints.
+
+Clients retrying a timed-out request send the same ``Idempotency-Key`` header.
+The first request runs normally and its response is saved in the
+``idempotency_keys`` table (shared by every worker) for ``IDEMPOTENCY_TTL``
+seconds; repeats get the saved response back without running the view, so no
+bcrypt hashing and no SQL beyond one primary-key lookup. While the first request
+is still running, duplicates wait for it (on an in-process event, or by
+polling the row when another worker owns it) instead of executing in parallel.
+
+Completed responses are also kept in a small in-process LRU so hot retries
+skip the database entirely. Expired rows are purged opportunistically, which
+keeps the table bounded to roughly one TTL window of keys.
+
+Nothing secret is stored: the request fingerprint is an HMAC keyed with the
+server secret, and an access token in a response is replaced by its identity
+and claims, from which a fresh token is minted on replay. Passwords are part
+of the fingerprint, so only a repeat carrying the original password gets
+that token; any other payload under the same key is rejected with a 422.
+"""
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import mysql.connector
+from flask import current_app, jsonify, request
+from flask_jwt_extended import create_access_token, decode_token, get_jwt_identity
+
+from db import DeadlineExceeded, fresh_deadline, get_db_connection, remaining_budget
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+IN_FLIGHT_LEASE = int(os.environ.get("IDEMPOTENCY_LEASE", "30"))
+WAIT_TIMEOUT = float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+# Time allowed to record the outcome, even after the request deadline passed
+BOOKKEEPING_TIMEOUT = 5.0
+POLL_INTERVAL = 0.05
+LOCAL_CACHE_SIZE = 1024
+MAX_STORED_BODY = 64 * 1024
+PURGE_EVERY = 100
+
+TOKEN_FIELD = "token"
+_TOKEN_MARKER = "__idempotent_token__"
+_JWT_RESERVED_CLAIMS = frozenset({"sub", "iat", "nbf", "exp", "jti", "type", "fresh", "csrf"})
+
+_lock = threading.Lock()
+_completed = OrderedDict()  # store key -> (expires_at, fingerprint, status, body, mimetype)
+_in_flight = {}  # store key -> threading.Event
+_writes = 0
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def _identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _secret():
+    secret = os.environ.get("IDEMPOTENCY_SECRET") or current_app.config["JWT_SECRET_KEY"]
+    return secret.encode("utf-8") if isinstance(secret, str) else secret
+
+
+def _fingerprint():
+    """Keyed hash of the request payload, independent of multipart boundaries.
+
+    Every field counts, passwords included: the HMAC key keeps the stored
+    value from being brute-forced back into the fields.
+    """
+    payload = request.get_json(silent=True)
+    if payload is None and request.form:
+        payload = sorted(request.form.items(multi=True))
+    if payload is None:
+        body = request.get_data()
+    else:
+        body = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    message = request.method.encode() + b" " + request.path.encode() + b" " + body
+    return hmac.new(_secret(), message, hashlib.sha256).hexdigest()
+
+
+def _storable_body(response):
+    """Response body with any access token swapped for what is needed to mint a new one."""
+    body = response.get_data()
+    if not response.is_json:
+        return body
+    payload = response.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get(TOKEN_FIELD), str):
+        return body
+    claims = decode_token(payload[TOKEN_FIELD])
+    payload[TOKEN_FIELD] = {_TOKEN_MARKER: {
+        "identity": claims["sub"],
+        "claims": {k: v for k, v in claims.items() if k not in _JWT_RESERVED_CLAIMS},
+        "expires_in": claims["exp"] - claims["iat"] if "exp" in claims else None,
+    }}
+    return json.dumps(payload).encode("utf-8")
+
+
+def _replay_body(body):
+    """Inverse of ``_storable_body``: mint a fresh token where the stored one was."""
+    if _TOKEN_MARKER.encode("utf-8") not in body:
+        return body
+    payload = json.loads(body)
+    spec = payload[TOKEN_FIELD][_TOKEN_MARKER]
+    payload[TOKEN_FIELD] = create_access_token(
+        identity=spec["identity"],
+        additional_claims=spec["claims"],
+        expires_delta=datetime.timedelta(seconds=spec["expires_in"]) if spec["expires_in"] else False,
+    )
+    return current_app.json.dumps(payload).encode("utf-8")
+
+
+def _local_get(store_key):
+    with _lock:
+        entry = _completed.get(store_key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del _completed[store_key]
+            return None
+        _completed.move_to_end(store_key)
+        return entry
+
+
+def _local_put(store_key, entry):
+    with _lock:
+        _completed[store_key] = entry
+        _completed.move_to_end(store_key)
+        while len(_completed) > LOCAL_CACHE_SIZE:
+            _completed.popitem(last=False)
+
+
+def _replay(entry, fingerprint):
+    _, stored_fingerprint, status, body, mimetype = entry
+    if stored_fingerprint != fingerprint:
+        return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+    response = current_app.response_class(_replay_body(body), status=status, mimetype=mimetype)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _wait_timeout():
+    """Wait at most WAIT_TIMEOUT, and never past the request deadline."""
+    remaining = remaining_budget()
+    return WAIT_TIMEOUT if remaining is None else max(0.0, min(WAIT_TIMEOUT, remaining))
+
+
+def _in_progress():
+    response = jsonify({"error": "A request with this Idempotency-Key is still in progress"})
+    response.headers["Retry-After"] = "1"
+    return response, 409
+
+
+# ---------------------------
+# Shared store
+# ---------------------------
+def _claim(conn, store_key, fingerprint):
+    """Try to own ``store_key``. Returns None when claimed, else the current row."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            INSERT INTO idempotency_keys (key_hash, fingerprint, status, locked_until, expires_at)
+            VALUES (%s, %s, 'IN_PROGRESS', NOW() + INTERVAL %s SECOND, NOW() + INTERVAL %s SECOND)
+        """, (store_key, fingerprint, IN_FLIGHT_LEASE, IDEMPOTENCY_TTL))
+        conn.commit()
+        return None
+    except mysql.connector.IntegrityError:
+        conn.rollback()
+
+    # Take over keys that expired or whose owner died mid-request
+    cur.execute("""
+        UPDATE idempotency_keys
+        SET fingerprint = %s, status = 'IN_PROGRESS', response_status = NULL,
+            response_body = NULL, content_type = NULL,
+            locked_until = NOW() + INTERVAL %s SECOND, expires_at = NOW() + INTERVAL %s SECOND
+        WHERE key_hash = %s
+          AND (expires_at < NOW() OR (status = 'IN_PROGRESS' AND locked_until < NOW()))
+    """, (fingerprint, IN_FLIGHT_LEASE, IDEMPOTENCY_TTL, store_key))
+    conn.commit()
+    if cur.rowcount == 1:
+        return None
+
+    cur.execute("""
+        SELECT fingerprint, status, response_status, response_body, content_type,
+               UNIX_TIMESTAMP(expires_at) AS expires_at
+        FROM idempotency_keys WHERE key_hash = %s
+    """, (store_key,))
+    row = cur.fetchone()
+    cur.close()
+    return row or {"status": "IN_PROGRESS"}
+
+
+def _row_entry(row):
+    body = row["response_body"]
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return (float(row["expires_at"]), row["fingerprint"], row["response_status"],
+            bytes(body or b""), row["content_type"])
+
+
+def _wait_for_other_worker(conn, store_key):
+    deadline = time.monotonic() + _wait_timeout()
+    cur = conn.cursor(dictionary=True)
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            cur.execute("""
+                SELECT fingerprint, status, response_status, response_body, content_type,
+                       UNIX_TIMESTAMP(expires_at) AS expires_at
+                FROM idempotency_keys WHERE key_hash = %s
+            """, (store_key,))
+            row = cur.fetchone()
+            conn.commit()
+            if row is None:
+                return None
+            if row["status"] == "COMPLETED":
+                return row
+    finally:
+        cur.close()
+    return {"status": "IN_PROGRESS"}
+
+
+def _release(store_key):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM idempotency_keys WHERE key_hash = %s", (store_key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _record_outcome(store_key, fingerprint, response=None):
+    """Save ``response`` for ``store_key`` (or free the key when there is none).
+
+    Runs on its own short budget: the view may have used up the request's
+    deadline after committing, and its key must not be left IN_PROGRESS.
+    Failures are logged, never raised, so the view's response still goes out.
+    """
+    try:
+        with fresh_deadline(BOOKKEEPING_TIMEOUT):
+            if response is None:
+                _release(store_key)
+            else:
+                _finish(store_key, fingerprint, response)
+    except (mysql.connector.Error, DeadlineExceeded):
+        logging.exception("Failed to record the outcome of an idempotent request")
+
+
+def _finish(store_key, fingerprint, response):
+    global _writes
+    body = _storable_body(response)
+    if response.status_code >= 500 or len(body) > MAX_STORED_BODY:
+        # Failed (or unstorable) responses stay retryable
+        _release(store_key)
+        return
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE idempotency_keys
+            SET status = 'COMPLETED', response_status = %s, response_body = %s, content_type = %s
+            WHERE key_hash = %s
+        """, (response.status_code, body, response.mimetype, store_key))
+        conn.commit()
+        _local_put(store_key, (time.time() + IDEMPOTENCY_TTL, fingerprint,
+                               response.status_code, body, response.mimetype))
+
+        with _lock:
+            _writes += 1
+            purge = _writes % PURGE_EVERY == 0
+        if purge:
+            cur.execute("DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT 1000")
+            conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# Decorator
+# ---------------------------
+def idempotent(scope):
+    """Make a view replay its first response for a repeated ``Idempotency-Key``.
+
+    Keys are namespaced by ``scope`` and the caller's JWT identity (when the
+    view is behind ``@jwt_required()``), so apply this *below* ``jwt_required``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+            store_key = hashlib.sha256(f"{scope}|{_identity()}|{key}".encode("utf-8")).hexdigest()
+            fingerprint = _fingerprint()
+
+            # Duplicates inside this worker wait on the first execution
+            while True:
+                entry = _local_get(store_key)
+                if entry:
+                    return _replay(entry, fingerprint)
+                with _lock:
+                    event = _in_flight.get(store_key)
+                    if event is None:
+                        event = _in_flight[store_key] = threading.Event()
+                        break
+                if not event.wait(_wait_timeout()):
+                    return _in_progress()
+
+            try:
+                try:
+                    conn = get_db_connection()
+                    try:
+                        row = _claim(conn, store_key, fingerprint)
+                        if row is not None and row["status"] == "IN_PROGRESS":
+                            row = _wait_for_other_worker(conn, store_key)
+                            if row is None:
+                                row = _claim(conn, store_key, fingerprint)
+                    finally:
+                        conn.close()
+                except mysql.connector.Error:
+                    logging.exception("Idempotency store unavailable, running request without it")
+                    return view(*args, **kwargs)
+
+                if row is not None:
+                    if row["status"] != "COMPLETED":
+                        return _in_progress()
+                    entry = _row_entry(row)
+                    _local_put(store_key, entry)
+                    return _replay(entry, fingerprint)
+
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                except Exception:
+                    _record_outcome(store_key, fingerprint)
+                    raise
+                _record_outcome(store_key, fingerprint, response)
+                return response
+            finally:
+                with _lock:
+                    _in_flight.pop(store_key, None)
+                event.set()
+        return wrapper
+    return decorator
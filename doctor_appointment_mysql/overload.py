@@ -0,0 +1,152 @@
+# overload.py
+"""Per-request deadlines and adaptive load shedding.
+
+Every request (except ``/ping``) gets a deadline from
+``app.config["REQUEST_DEADLINES"]``, looked up by endpoint name, then
+blueprint name, then ``"default"``. The deadline lives in
+``db.request_deadline``, and the DB layer turns the time left into a
+connection-slot wait limit, a socket timeout and a ``MAX_EXECUTION_TIME`` for
+the session. When one of those fires the DB layer raises ``DeadlineExceeded``,
+which views let propagate and which is answered here with 504.
+
+Admission control keeps at most ``limit`` requests in flight per worker and
+answers the rest immediately with 503 + ``Retry-After``. The limit adapts
+AIMD-style. It grows by about one per ``limit`` fast completions. It shrinks
+by 10% (at most every ``DECREASE_INTERVAL``) when requests miss their
+latency target, hit their deadline, or arrive while the smoothed wait for a
+DB connection is above ``POOL_WAIT_SHED``. The pool signal only lowers the
+limit; requests are turned away by the limit alone.
+
+Endpoints in ``app.config["ADMISSION_EXEMPT"]`` don't use the database
+(the in-memory availability search, logouts) and skip admission control:
+they stay available while the database is the bottleneck.
+"""
+import threading
+import time
+
+from flask import g, jsonify, request
+
+from db import DeadlineExceeded, connection_wait_ewma, request_deadline
+
+DEFAULT_DEADLINES = {
+    "default": 5.0,
+    "admin": 10.0,
+    "admin.bulk_import": 300.0,
+    "admin.export_patients": 60.0,
+}
+EXEMPT_ENDPOINTS = {"ping", "static"}
+DEFAULT_ADMISSION_EXEMPT = {
+    "doctor.available_doctors",
+    "doctor.logout",
+    "patient.patient_logout",
+    "admin.admin_logout",
+}
+
+# A request is "slow" once it used this share of its deadline
+LATENCY_TARGET = 0.5
+POOL_WAIT_SHED = 0.5
+DECREASE_INTERVAL = 0.1
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that follows what the database can currently absorb."""
+
+    def __init__(self, initial=64, minimum=4, maximum=512):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if connection_wait_ewma() > POOL_WAIT_SHED:
+                # Requests already queue for DB connections: admit fewer
+                self._decrease()
+            if self.in_flight >= int(self.limit):
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, slow, timed_out):
+        with self._lock:
+            self.in_flight -= 1
+            if timed_out:
+                self.timed_out += 1
+            if slow or timed_out:
+                self._decrease()
+            elif self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_INTERVAL:
+            self.limit = max(self.minimum, self.limit * 0.9)
+            self._last_decrease = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "timed_out": self.timed_out,
+                "connection_wait_ms": round(connection_wait_ewma() * 1000, 1),
+            }
+
+
+limiter = AdaptiveLimiter()
+
+
+def _budget(app, endpoint):
+    deadlines = app.config["REQUEST_DEADLINES"]
+    if endpoint in deadlines:
+        return deadlines[endpoint]
+    blueprint = endpoint.rpartition(".")[0] if endpoint else ""
+    return deadlines.get(blueprint, deadlines["default"])
+
+
+def init_app(app):
+    app.config.setdefault("REQUEST_DEADLINES", dict(DEFAULT_DEADLINES))
+    app.config.setdefault("LOAD_SHEDDING", True)
+    app.config.setdefault("ADMISSION_EXEMPT", set(DEFAULT_ADMISSION_EXEMPT))
+
+    @app.before_request
+    def admit():
+        if request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        budget = _budget(app, request.endpoint)
+        g.request_started = time.monotonic()
+        g.request_budget = budget
+        request_deadline.set(g.request_started + budget)
+
+        if app.config["LOAD_SHEDDING"] and request.endpoint not in app.config["ADMISSION_EXEMPT"]:
+            if not limiter.try_acquire():
+                response = jsonify({"error": "Server is busy, please retry shortly"})
+                response.headers["Retry-After"] = "1"
+                return response, 503
+            g.admitted = True
+        return None
+
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(e):
+        g.deadline_exceeded = True
+        return jsonify({"error": "Request timed out, please retry"}), 504
+
+    @app.teardown_request
+    def finish(exc):
+        request_deadline.set(None)
+        if not g.pop("admitted", False):
+            return
+        elapsed = time.monotonic() - g.request_started
+        limiter.release(
+            slow=elapsed > g.request_budget * LATENCY_TARGET,
+            timed_out=g.get("deadline_exceeded", False),
+        )
@@ -3,10 +3,13 @@ from flask_cors import CORS
 from flask_jwt_extended import (
     create_access_token, get_jwt_identity, jwt_required, get_jwt
 )
-from db import get_db_connection
+from db import DeadlineExceeded, get_shard_connection
+from sharding import allocate, release, locate_email, connection_for_patient
+from profile_updates import save_profile, parse_version, CONFLICT, NOT_FOUND, UNCHANGED
+from idempotency import idempotent
+from validation import validate_json, validate_form, PATIENT_REGISTER, PATIENT_UPDATE, LOGIN
 import bcrypt
 import datetime
-import re
 import logging
 
 # Configure logging
@@ -19,11 +22,11 @@ CORS(patient_bp)
 # Register API
 # ---------------------------
 @patient_bp.route("/api/patient/register", methods=["POST"])
+@validate_json(PATIENT_REGISTER)
+@idempotent("patient.register")
 def register():
     try:
         data = request.get_json()
-        if data is None:
-            return jsonify({"error": "Invalid or missing JSON payload"}), 400
 
         # Required Fields
         full_name = data.get("fullName")
@@ -50,67 +53,49 @@ def register():
         document_path = data.get("documentPath")
         role = data.get("role", "PATIENT")
 
-        # Validation
-        if not all([full_name, email, password, mobile]):
-            return jsonify({"error": "Missing required fields"}), 400
-
-        email_regex = r"[^@]+@[^@]+\.[^@]+"
-        if not re.match(email_regex, email):
-            return jsonify({"error": "Invalid email format"}), 400
+        # The patient directory rejects duplicate emails (across all shards)
+        # before we pay for the bcrypt hash, and picks the id and shard
+        placement = allocate(email)
+        if placement is None:
+            return jsonify({"error": "Email already registered"}), 409
+        patient_id, shard = placement
 
-        if len(password) < 6:
-            return jsonify({"error": "Password must be at least 6 characters long"}), 400
+        try:
+            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-        if date_of_birth:
+            conn = get_shard_connection(shard)
             try:
-                datetime.datetime.strptime(date_of_birth, "%Y-%m-%d")
-            except ValueError:
-                return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
-
-        if role not in ["PATIENT", "DOCTOR"]:
-            return jsonify({"error": "Invalid role"}), 400
-
-        if gender and gender.upper() not in ["MALE", "FEMALE", "OTHER"]:
-            return jsonify({"error": "Invalid gender"}), 400
-
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM patient WHERE email = %s", (email,))
-        if cursor.fetchone():
-            return jsonify({"error": "Email already registered"}), 409
-
-        cursor.execute("""
-            INSERT INTO patient (
-                full_name, email, password, mobile, gender, date_of_birth, blood_group,
-                address, emergency_contact, city, state, zip, country,
-                allergies, conditions, medications, surgeries,
-                emergency_contact_name, emergency_contact_number, document_path,
-                role, is_active, verified, created_at, updated_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s,
-                %s, %s, %s,
-                %s, %s, %s, NOW(), NOW()
-            )
-        """, (
-            full_name, email, hashed_password, mobile, gender, date_of_birth, blood_group,
-            address, emergency_contact, city, state, zip_code, country,
-            allergies, conditions, medications, surgeries,
-            emergency_contact_name, emergency_contact_number, document_path,
-            role, True, False
-        ))
-        conn.commit()
-
-        cursor.execute("SELECT id FROM patient WHERE email = %s", (email,))
-        patient = cursor.fetchone()
-        conn.close()
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO patient (
+                        id, full_name, email, password, mobile, gender, date_of_birth, blood_group,
+                        address, emergency_contact, city, state, zip, country,
+                        allergies, conditions, medications, surgeries,
+                        emergency_contact_name, emergency_contact_number, document_path,
+                        role, is_active, verified, created_at, updated_at
+                    ) VALUES (
+                        %s, %s, %s, %s, %s, %s, %s, %s,
+                        %s, %s, %s, %s, %s, %s,
+                        %s, %s, %s, %s,
+                        %s, %s, %s,
+                        %s, %s, %s, NOW(), NOW()
+                    )
+                """, (
+                    patient_id, full_name, email, hashed_password, mobile, gender, date_of_birth, blood_group,
+                    address, emergency_contact, city, state, zip_code, country,
+                    allergies, conditions, medications, surgeries,
+                    emergency_contact_name, emergency_contact_number, document_path,
+                    role, True, False
+                ))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            release([patient_id])
+            raise
 
         access_token = create_access_token(
-            identity=str(patient[0]),
+            identity=str(patient_id),
             additional_claims={"email": email, "role": role}
         )
 
@@ -119,6 +104,8 @@ def register():
             "token": access_token
         }), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.exception("Register Error")
         return jsonify({"error": "Something went wrong. Please try again later."}), 500
@@ -127,25 +114,33 @@ def register():
 # ---------------------------
 # Login API
 # ---------------------------
+def _fetch_located(located):
+    """Patient row for a ``locate_email`` result, or None."""
+    if not located:
+        return None
+    conn = get_shard_connection(located[1])
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM patient WHERE id = %s", (located[0],))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
 @patient_bp.route("/api/patient/login", methods=["POST"])
+@validate_json(LOGIN)
 def login():
     try:
         data = request.get_json()
-        if data is None:
-            return jsonify({"error": "Invalid or missing JSON payload"}), 400
-
         email = data.get("email", "").lower()
         password = data.get("password")
 
-        if not email or not password:
-            return jsonify({"error": "Email and password required"}), 400
-
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT * FROM patient WHERE email = %s", (email,))
-        patient = cursor.fetchone()
-        conn.close()
+        located = locate_email(email)
+        patient = _fetch_located(located)
+        if located and patient is None:
+            # The cached directory entry may have been released since; ask again
+            located = locate_email(email, refresh=True)
+            patient = _fetch_located(located)
 
         if patient and bcrypt.checkpw(password.encode('utf-8'), patient['password'].encode('utf-8')):
             access_token = create_access_token(
@@ -169,6 +164,8 @@ def login():
         else:
             return jsonify({"error": "Invalid email or password"}), 401
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.exception("Login Error")
         return jsonify({"error": "Something went wrong. Please try again later."}), 500
@@ -186,7 +183,9 @@ def get_profile():
         email = claims.get("email")
         role = claims.get("role")
 
-        conn = get_db_connection()
+        conn = connection_for_patient(patient_id)
+        if conn is None:
+            return jsonify({"error": "Patient not found"}), 404
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -210,6 +209,8 @@ def get_profile():
         else:
             return jsonify({"error": "Patient not found"}), 404
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.exception("Profile Error")
         return jsonify({"error": "Something went wrong. Please try again later."}), 500
@@ -219,6 +220,8 @@ def get_profile():
 # ---------------------------
 @patient_bp.route("/api/patient/updateprofile", methods=["PUT"])
 @jwt_required()
+@validate_form(PATIENT_UPDATE)
+@idempotent("patient.updateprofile")
 def update_patient_profile():
     try:
         patient_id = get_jwt_identity()
@@ -250,43 +253,36 @@ def update_patient_profile():
             "document_path": data.get("documentPath")
         }
 
-        fields = []
-        values = []
-
-        for field, value in allowed_fields.items():
-            if value is not None:
-                fields.append(f"{field} = %s")
-                values.append(value)
-
-        if not fields:
+        incoming = {field: value for field, value in allowed_fields.items() if value is not None}
+        if not incoming:
             return jsonify({"error": "No fields to update"}), 400
 
-        # values.append(patient_id)
-        #
-        # query = f"""
-        #     UPDATE patient
-        #     SET {', '.join(fields)}, updated_at = %s
-        #     WHERE id = %s
-        # """
-        # values.insert(-1, datetime.utcnow())  # Add updated_at before patient_id
-
-        values.append(datetime.datetime.utcnow())  # updated_at
-        values.append(patient_id)  # WHERE id = %s
-
-        query = f"""
-            UPDATE patient
-            SET {', '.join(fields)}, updated_at = %s
-            WHERE id = %s
-        """
+        conn = connection_for_patient(patient_id)
+        if conn is None:
+            return jsonify({"error": "Patient not found"}), 404
+        try:
+            status, _, current_version = save_profile(
+                conn, "patient", patient_id, incoming,
+                version=parse_version(data.get("updatedAt")),
+                updated_at=datetime.datetime.utcnow()
+            )
+        finally:
+            conn.close()
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, values)
-        conn.commit()
-        conn.close()
+        if status == NOT_FOUND:
+            return jsonify({"error": "Patient not found"}), 404
+        if status == CONFLICT:
+            return jsonify({
+                "error": "Profile was changed elsewhere. Reload it and try again.",
+                "updatedAt": current_version
+            }), 409
+        if status == UNCHANGED:
+            return jsonify({"message": "✅ Patient profile unchanged", "unchanged": True}), 200
 
         return jsonify({"message": "✅ Patient profile updated successfully"}), 200
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.exception("Error updating patient profile")
         return jsonify({"error": "Something went wrong. Try again later."}), 500
@@ -0,0 +1,187 @@
+# profile_updates.py
+"""Change-aware profile updates shared by the patient and doctor endpoints.
+
+Profile screens resubmit the whole form on every save. Instead of rewriting
+every submitted column, ``save_profile`` reads the current row, diffs it
+against the submission and:
+
+* writes nothing (no row lock, no binlog event, ``updated_at`` untouched)
+  when nothing changed;
+* otherwise UPDATEs only the changed columns, guarded by a compare-and-set
+  on ``updated_at`` and on the old values of those columns, so two
+  concurrent edits cannot silently overwrite each other.
+
+A client may also send back the ``updated_at`` it loaded the form with; if
+the row changed since, the save is refused as a conflict.
+
+Bursts of saves are not coalesced into one write. Each save answers its own
+HTTP request with its own result (including conflicts), so merging them
+would mean holding requests back. Repeated identical submissions, the
+usual burst, already cost only the read.
+
+Counters per table (submitted vs written columns, skipped saves, conflicts)
+are exposed through ``stats()``.
+"""
+import datetime
+import decimal
+import email.utils
+import re
+import threading
+
+UNCHANGED = "unchanged"
+UPDATED = "updated"
+CONFLICT = "conflict"
+NOT_FOUND = "not_found"
+
+_TIME_RE = re.compile(r"^(\d{1,3}):(\d{2})(?::(\d{2}))?$")
+
+_lock = threading.Lock()
+_counters = {}
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+def _same(current, new):
+    """Whether the submitted ``new`` value equals the stored ``current`` one."""
+    if current is None or new is None:
+        return current is None and new is None
+    if isinstance(current, datetime.timedelta):
+        # TIME columns come back as timedelta; forms send "HH:MM" or "HH:MM:SS"
+        match = _TIME_RE.match(str(new).strip())
+        if not match:
+            return False
+        hours, minutes, seconds = (int(part or 0) for part in match.groups())
+        return hours * 3600 + minutes * 60 + seconds == int(current.total_seconds())
+    if isinstance(current, datetime.datetime):
+        return current.isoformat(sep=" ") == str(new).replace("T", " ")
+    if isinstance(current, datetime.date):
+        return current.isoformat() == str(new)
+    if isinstance(current, (int, float, decimal.Decimal)) and not isinstance(new, bool):
+        try:
+            return decimal.Decimal(str(current)) == decimal.Decimal(str(new).strip())
+        except decimal.InvalidOperation:
+            return False
+    if isinstance(current, bytes):
+        current = current.decode("utf-8", "replace")
+    return str(current) == str(new)
+
+
+def diff(current, incoming):
+    """``{column: new value}`` for the submitted columns that actually differ."""
+    return {
+        column: value for column, value in incoming.items()
+        if not _same(current.get(column), value)
+    }
+
+
+def parse_version(value):
+    """Parse a client-echoed ``updated_at`` (RFC 1123 as rendered by jsonify, or ISO).
+
+    Returns None when no version was sent. A value that cannot be parsed
+    raises ValueError: ignoring it would silently skip the conflict check.
+    """
+    if not value:
+        return None
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid updated_at: {value!r}") from None
+    return parsed.replace(tzinfo=None)
+
+
+def _is_stale(version, current_updated_at):
+    if version is None or current_updated_at is None:
+        return False
+    return version.replace(microsecond=0) != current_updated_at.replace(microsecond=0)
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+def _count(table, **deltas):
+    with _lock:
+        counters = _counters.setdefault(table, {
+            "saves": 0, "skipped": 0, "written": 0, "conflicts": 0,
+            "columns_submitted": 0, "columns_written": 0,
+        })
+        for key, delta in deltas.items():
+            counters[key] += delta
+
+
+def stats():
+    """Per-table counters plus the share of saves / columns that skipped the write."""
+    with _lock:
+        result = {}
+        for table, counters in _counters.items():
+            entry = dict(counters)
+            entry["skipped_ratio"] = round(counters["skipped"] / counters["saves"], 3) if counters["saves"] else 0.0
+            entry["columns_skipped_ratio"] = round(
+                1 - counters["columns_written"] / counters["columns_submitted"], 3
+            ) if counters["columns_submitted"] else 0.0
+            result[table] = entry
+        return result
+
+
+# ---------------------------
+# Save
+# ---------------------------
+def save_profile(conn, table, row_id, incoming, version=None, updated_at=None):
+    """Apply ``incoming`` {column: value} to row ``row_id`` of ``table``.
+
+    ``version`` is the client's ``updated_at`` (datetime) if it sent one;
+    ``updated_at`` the value to stamp (defaults to ``NOW()``). Returns
+    ``(status, changed_columns, current_updated_at)``. Table and column names
+    must come from the caller's whitelist, never from the request.
+    """
+    columns = list(incoming)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"SELECT {', '.join(columns)}, updated_at FROM {table} WHERE id = %s",
+            (row_id,),
+        )
+        current = cursor.fetchone()
+        if current is None:
+            return NOT_FOUND, {}, None
+
+        _count(table, saves=1, columns_submitted=len(columns))
+        if _is_stale(version, current["updated_at"]):
+            _count(table, conflicts=1)
+            return CONFLICT, {}, current["updated_at"]
+
+        changes = diff(current, incoming)
+        if not changes:
+            _count(table, skipped=1)
+            return UNCHANGED, {}, current["updated_at"]
+
+        assignments = [f"{column} = %s" for column in changes]
+        values = list(changes.values())
+        if updated_at is None:
+            assignments.append("updated_at = NOW()")
+        else:
+            assignments.append("updated_at = %s")
+            values.append(updated_at)
+
+        # Compare-and-set: only write if nobody changed the row since we read it
+        guards = ["updated_at <=> %s"] + [f"{column} <=> %s" for column in changes]
+        values.append(row_id)
+        values.append(current["updated_at"])
+        values.extend(current[column] for column in changes)
+
+        cursor.execute(
+            f"UPDATE {table} SET {', '.join(assignments)} WHERE id = %s AND {' AND '.join(guards)}",
+            values,
+        )
+        conn.commit()
+        if cursor.rowcount != 1:
+            _count(table, conflicts=1)
+            return CONFLICT, {}, current["updated_at"]
+
+        _count(table, written=1, columns_written=len(changes))
+        return UPDATED, changes, None
+    finally:
+        cursor.close()
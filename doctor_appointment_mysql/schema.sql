@@ -1,5 +1,7 @@
-CREATE DATABASE IF NOT EXISTS docterapp;
-USE docterapp;
+-- Schema of the main database (db.DB_CONFIG). Every statement is safe to
+-- re-run, so upgrading an install is: mysql -u root -p < schema.sql
+CREATE DATABASE IF NOT EXISTS doctorapp;
+USE doctorapp;
 
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -15,4 +17,155 @@ CREATE TABLE IF NOT EXISTS appointments (
     date DATE,
     time TIME,
     FOREIGN KEY (user_id) REFERENCES users(id)
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS admin (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    full_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL DEFAULT 'ADMIN',
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_admin_email (email)
+);
+
+CREATE TABLE IF NOT EXISTS doctors (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    full_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    mobile VARCHAR(20),
+    gender VARCHAR(10),
+    location VARCHAR(255),
+    registration_number VARCHAR(100),
+    council VARCHAR(255),
+    degree VARCHAR(255),
+    specialty VARCHAR(100),
+    experience VARCHAR(50),
+    clinic_name VARCHAR(255),
+    clinic_address VARCHAR(500),
+    profile_photo VARCHAR(255),
+    role VARCHAR(20) NOT NULL DEFAULT 'DOCTOR',
+    dob DATE,
+    blood_group VARCHAR(10),
+    available_days VARCHAR(100),
+    available_from TIME,
+    available_to TIME,
+    city VARCHAR(100),
+    state VARCHAR(100),
+    zip_code VARCHAR(20),
+    languages VARCHAR(255),
+    status VARCHAR(20) NOT NULL DEFAULT 'ACTIVE',
+    documents TEXT,
+    documents_verified BOOLEAN NOT NULL DEFAULT FALSE,
+    approved BOOLEAN NOT NULL DEFAULT FALSE,
+    suspended BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_doctors_email (email)
+);
+
+-- Patient rows. This table is also created in every PATIENT_SHARDS database
+-- by setup_shards.py, which runs the statements between the two markers.
+-- patient shard: begin
+CREATE TABLE IF NOT EXISTS patient (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    full_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    mobile VARCHAR(20),
+    gender VARCHAR(10),
+    date_of_birth DATE,
+    blood_group VARCHAR(10),
+    address VARCHAR(500),
+    emergency_contact VARCHAR(20),
+    city VARCHAR(100),
+    state VARCHAR(100),
+    zip VARCHAR(20),
+    country VARCHAR(100),
+    allergies TEXT,
+    conditions TEXT,
+    medications TEXT,
+    surgeries TEXT,
+    emergency_contact_name VARCHAR(100),
+    emergency_contact_number VARCHAR(20),
+    document_path VARCHAR(255),
+    photo_path VARCHAR(255),
+    role VARCHAR(20) NOT NULL DEFAULT 'PATIENT',
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    verified BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_patient_email (email)
+);
+-- patient shard: end
+
+-- Responses saved for Idempotency-Key replays (see idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key_hash CHAR(64) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status ENUM('IN_PROGRESS', 'COMPLETED') NOT NULL,
+    response_status SMALLINT NULL,
+    response_body MEDIUMBLOB NULL,
+    content_type VARCHAR(100) NULL,
+    locked_until DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    KEY idx_idempotency_expires (expires_at)
+);
+
+
+-- Bulk import (bulk_import.py) relies on unique emails to reject duplicates.
+-- The tables above have the keys; older installs get them here. Older
+-- versions of doctor.register did not check for duplicates, so list any
+-- emails used more than once first. Those accounts must be merged (or
+-- their emails changed) by hand; until then the ALTERs below fail with a
+-- duplicate entry error. Both steps are safe to re-run.
+SELECT 'doctors' AS table_name, email, COUNT(*) AS accounts, GROUP_CONCAT(id ORDER BY id) AS ids
+FROM doctors GROUP BY email HAVING COUNT(*) > 1
+UNION ALL
+SELECT 'patient', email, COUNT(*), GROUP_CONCAT(id ORDER BY id)
+FROM patient GROUP BY email HAVING COUNT(*) > 1;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'doctors' AND index_name = 'uq_doctors_email') = 0,
+    'ALTER TABLE doctors ADD UNIQUE KEY uq_doctors_email (email)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'patient' AND index_name = 'uq_patient_email') = 0,
+    'ALTER TABLE patient ADD UNIQUE KEY uq_patient_email (email)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+
+-- Patient shard directory (see sharding.py); lives in the main database.
+-- Patient rows live in the databases listed in PATIENT_SHARDS, under these ids.
+-- Create their patient tables with: python setup_shards.py
+CREATE TABLE IF NOT EXISTS patient_directory (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(100) NOT NULL,
+    shard SMALLINT NOT NULL,
+    UNIQUE KEY uq_patient_directory_email (email)
+);
+
+-- Existing installs: register every current patient in the directory, on
+-- shard 0 (the main database, where their rows already are). Inserting the
+-- existing ids also moves the directory's AUTO_INCREMENT past the highest
+-- patient id, so new registrations cannot collide with them. Run this
+-- before starting the sharded code (an install without it cannot log
+-- existing patients in, and new ids clash with theirs). Safe to re-run.
+INSERT INTO patient_directory (id, email, shard)
+SELECT p.id, LOWER(p.email), 0
+FROM patient p
+LEFT JOIN patient_directory d ON d.id = p.id
+WHERE d.id IS NULL;
@@ -0,0 +1,63 @@
+# setup_shards.py
+"""Create the databases listed in ``PATIENT_SHARDS`` and their ``patient`` table.
+
+The table definition is the one in schema.sql, between the
+``-- patient shard: begin`` and ``-- patient shard: end`` markers, so the
+main database and the shards never drift apart. Safe to re-run.
+
+Local setup with several schemas on one server, keeping the main database
+as shard 0 (where the patients of an upgraded install already are)::
+
+    mysql -u root -p < schema.sql
+    export PATIENT_SHARDS='[{}, {"database": "doctorapp_p1"}, {"database": "doctorapp_p2"}]'
+    python setup_shards.py
+
+The app must then run with the same ``PATIENT_SHARDS``.
+"""
+import os
+import sys
+
+import mysql.connector
+
+from db import PATIENT_SHARDS
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+BEGIN_MARKER = "-- patient shard: begin"
+END_MARKER = "-- patient shard: end"
+
+
+def shard_statements(schema_text):
+    """SQL statements between the patient shard markers of ``schema_text``."""
+    start = schema_text.index(BEGIN_MARKER) + len(BEGIN_MARKER)
+    section = schema_text[start:schema_text.index(END_MARKER, start)]
+    lines = [line for line in section.splitlines() if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def setup_shard(config, statements):
+    """Create ``config``'s database if needed and run ``statements`` in it."""
+    config = dict(config)
+    database = config.pop("database")
+    conn = mysql.connector.connect(**config)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        cur.execute(f"USE `{database}`")
+        for statement in statements:
+            cur.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        statements = shard_statements(f.read())
+    for shard, config in enumerate(PATIENT_SHARDS):
+        setup_shard(config, statements)
+        print(f"shard {shard}: {config.get('host')}:{config.get('port')}/{config['database']} ready")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# sharding.py
+"""Routing of ``patient`` rows across the databases in ``db.PATIENT_SHARDS``.
+
+The main database holds a small ``patient_directory`` table
+(id, email, shard). It hands out globally unique patient ids, enforces email
+uniqueness across all shards, and answers "which shard holds patient X /
+email Y". New patients are placed by a stable hash of their email. The
+patient row itself lives on that shard under the directory id. Directory
+entries never move, so lookups are cached in-process. An entry can however be
+released when its registration fails and the email registered again under a
+new id; a worker still caching the released entry finds no patient row, and
+``locate_email(email, refresh=True)`` then looks the email up again.
+
+Listing and export queries fan out to every shard in parallel and are merged
+by id. ``python setup_shards.py`` creates the shard databases and their
+``patient`` table.
+
+Upgrading an install that predates the directory: apply schema.sql first.
+Its backfill step enters every existing patient (on shard 0) and moves the
+directory's id counter past them; without it existing patients are not
+found and new ids collide with theirs.
+"""
+import contextvars
+import heapq
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from db import PATIENT_SHARDS, fresh_deadline, get_db_connection, get_shard_connection
+
+SHARD_COUNT = len(PATIENT_SHARDS)
+CACHE_SIZE = 100_000
+RELEASE_TIMEOUT = 5.0
+
+_lock = threading.Lock()
+_by_id = OrderedDict()  # patient id -> shard
+_by_email = OrderedDict()  # email -> (patient id, shard)
+_executor = ThreadPoolExecutor(max_workers=max(SHARD_COUNT, 1), thread_name_prefix="patient-shard")
+
+
+# ---------------------------
+# Cache helpers
+# ---------------------------
+def _cache_get(cache, key):
+    with _lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(patient_id, email, shard):
+    with _lock:
+        _by_id[patient_id] = shard
+        _by_id.move_to_end(patient_id)
+        if email:
+            _by_email[email] = (patient_id, shard)
+            _by_email.move_to_end(email)
+        for cache in (_by_id, _by_email):
+            while len(cache) > CACHE_SIZE:
+                cache.popitem(last=False)
+
+
+# ---------------------------
+# Directory
+# ---------------------------
+def shard_for_email(email):
+    """Placement shard for a new patient."""
+    return zlib.crc32(email.lower().encode("utf-8")) % SHARD_COUNT
+
+
+def allocate(email):
+    """Reserve an id for a new patient; returns (id, shard) or None if the email exists."""
+    shard = shard_for_email(email)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO patient_directory (email, shard) VALUES (%s, %s)", (email, shard))
+        conn.commit()
+        _cache_put(cur.lastrowid, email.lower(), shard)
+        return cur.lastrowid, shard
+    except mysql.connector.IntegrityError:
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def allocate_many(emails):
+    """Reserve ids for many new patients at once.
+
+    Returns ``{email: (id, shard)}`` for the emails that were not registered
+    yet. The existing emails are locked first (including the index gaps), so
+    a concurrent register cannot sneak in between the insert and the read back.
+    """
+    if not emails:
+        return {}
+    marks = ", ".join(["%s"] * len(emails))
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        conn.start_transaction()
+        cur.execute(f"SELECT email FROM patient_directory WHERE email IN ({marks}) FOR UPDATE", emails)
+        existing = {row[0].lower() for row in cur.fetchall()}
+        new = [e for e in emails if e.lower() not in existing]
+        if new:
+            cur.execute(
+                "INSERT IGNORE INTO patient_directory (email, shard) VALUES "
+                + ", ".join(["(%s, %s)"] * len(new)),
+                [v for e in new for v in (e, shard_for_email(e))],
+            )
+            cur.execute(
+                f"SELECT id, email, shard FROM patient_directory WHERE email IN ({', '.join(['%s'] * len(new))})",
+                new,
+            )
+            allocated = {email.lower(): (row_id, shard) for row_id, email, shard in cur.fetchall()}
+        else:
+            allocated = {}
+        conn.commit()
+        return allocated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def release(patient_ids):
+    """Drop directory entries whose patient rows could not be written.
+
+    Runs on its own budget: it is called on failure paths, often because the
+    request ran out of time, and a leaked entry would block the email for good.
+    """
+    if not patient_ids:
+        return
+    with fresh_deadline(RELEASE_TIMEOUT):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"DELETE FROM patient_directory WHERE id IN ({', '.join(['%s'] * len(patient_ids))})",
+                list(patient_ids),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    with _lock:
+        for patient_id in patient_ids:
+            _by_id.pop(patient_id, None)
+        for email in [e for e, (i, _) in _by_email.items() if i in patient_ids]:
+            del _by_email[email]
+
+
+def shard_for_id(patient_id):
+    """Shard holding ``patient_id``, or None for an unknown patient."""
+    patient_id = int(patient_id)
+    shard = _cache_get(_by_id, patient_id)
+    if shard is not None:
+        return shard
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT email, shard FROM patient_directory WHERE id = %s", (patient_id,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    _cache_put(patient_id, row[0].lower(), row[1])
+    return row[1]
+
+
+def locate_email(email, refresh=False):
+    """(patient id, shard) for a login email, or None.
+
+    ``refresh`` drops the cached entry and asks the directory again; use it
+    when the cached patient row turned out to be missing.
+    """
+    email = email.lower()
+    if refresh:
+        with _lock:
+            _by_email.pop(email, None)
+    else:
+        found = _cache_get(_by_email, email)
+        if found is not None:
+            return found
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, shard FROM patient_directory WHERE email = %s", (email,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    _cache_put(row[0], email, row[1])
+    return row[0], row[1]
+
+
+# ---------------------------
+# Connections
+# ---------------------------
+def connection_for_patient(patient_id):
+    """Connection to the shard holding ``patient_id``, or None if unknown."""
+    shard = shard_for_id(patient_id)
+    if shard is None:
+        return None
+    return get_shard_connection(shard)
+
+
+def fan_out(fn):
+    """Run ``fn(conn, shard)`` on every shard in parallel; returns the results in shard order."""
+    def run(shard):
+        conn = get_shard_connection(shard)
+        try:
+            return fn(conn, shard)
+        finally:
+            conn.close()
+
+    if SHARD_COUNT == 1:
+        return [run(0)]
+    # Each task runs in a copy of the caller's context to keep its request deadline
+    futures = [_executor.submit(contextvars.copy_context().run, run, shard) for shard in range(SHARD_COUNT)]
+    return [f.result() for f in futures]
+
+
+def fetch_all_patients(query, params=()):
+    """Run ``query`` (which must ``ORDER BY id``) on all shards; merged rows by id."""
+    def run(conn, shard):
+        cur = conn.cursor(dictionary=True)
+        cur.execute(query, params)
+        return cur.fetchall()
+
+    return list(heapq.merge(*fan_out(run), key=lambda row: row["id"]))
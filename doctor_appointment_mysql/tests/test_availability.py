@@ -0,0 +1,258 @@
+# tests/test_availability.py
+import datetime
+import threading
+
+import pytest
+
+from availability import (
+    SLOTS_PER_DAY, AvailabilityIndex, parse_day, parse_days, parse_minutes, week_slots,
+)
+
+
+def doctor(doctor_id, days="Mon-Fri", start="09:00", end="17:00", **fields):
+    row = {
+        "id": doctor_id,
+        "full_name": f"Doctor {doctor_id}",
+        "specialty": "Cardiology",
+        "city": "Pune",
+        "available_days": days,
+        "available_from": start,
+        "available_to": end,
+        "approved": True,
+        "suspended": False,
+    }
+    row.update(fields)
+    return row
+
+
+def ids(result):
+    return sorted(d["id"] for d in result)
+
+
+# ---------------------------
+# Parsing
+# ---------------------------
+@pytest.mark.parametrize("value, expected", [
+    ("Mon", 0), ("monday", 0), ("TUE", 1), ("tues", 1), ("Th", 3), ("thurs", 3), (" sun ", 6),
+])
+def test_parse_day(value, expected):
+    assert parse_day(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "Mon-Fri", "Funday", "Mon,Tue"])
+def test_parse_day_rejects_anything_but_one_day(value):
+    with pytest.raises(ValueError):
+        parse_day(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Mon,Wed,Fri", [0, 2, 4]),
+    ("Monday Wednesday", [0, 2]),
+    ("Mon-Fri", [0, 1, 2, 3, 4]),
+    ("Mon to Wed", [0, 1, 2]),
+    ("Sat-Mon", [0, 5, 6]),
+    ("Mon-Wed, Sat; Sun", [0, 1, 2, 5, 6]),
+    ("tue/thu|sat", [1, 3, 5]),
+    ("Mon,Mon", [0]),
+    ("", []),
+    (None, []),
+])
+def test_parse_days(value, expected):
+    assert parse_days(value) == expected
+
+
+def test_parse_days_rejects_unknown_day():
+    with pytest.raises(ValueError):
+        parse_days("Mon,Funday")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("09:30", 570),
+    ("9:05:59", 545),
+    ("24:00", 1440),
+    (datetime.timedelta(hours=17, minutes=45), 1065),
+    (datetime.time(8, 15), 495),
+    ("", None),
+    (None, None),
+])
+def test_parse_minutes(value, expected):
+    assert parse_minutes(value) == expected
+
+
+@pytest.mark.parametrize("value", ["25:00", "24:30", "10:60", "noon", "10"])
+def test_parse_minutes_rejects_invalid_times(value):
+    with pytest.raises(ValueError):
+        parse_minutes(value)
+
+
+def test_week_slots_only_counts_fully_covered_slots():
+    # 09:10-10:00 on Monday covers the 09:15, 09:30 and 09:45 slots
+    assert week_slots("Mon", "09:10", "10:00") == [37, 38, 39]
+
+
+def test_week_slots_wraps_past_midnight_and_end_of_week():
+    slots = week_slots("Sun", "23:30", "00:30")
+    assert slots == [7 * SLOTS_PER_DAY - 2, 7 * SLOTS_PER_DAY - 1, 0, 1]
+
+
+def test_week_slots_ignores_unparsable_schedules():
+    assert week_slots("Funday", "09:00", "10:00") == []
+    assert week_slots("Mon", None, "10:00") == []
+
+
+# ---------------------------
+# Index
+# ---------------------------
+def test_available_filters_by_window_specialty_city_and_listing():
+    index = AvailabilityIndex()
+    index.load([
+        doctor(1),
+        doctor(2, start="12:00"),
+        doctor(3, specialty="Dermatology"),
+        doctor(4, city="Mumbai"),
+        doctor(5, approved=False),
+        doctor(6, suspended=True),
+        doctor(7, days="Sat,Sun"),
+    ])
+    assert ids(index.available("Tue", "10:30")) == [1, 3, 4]
+    assert ids(index.available("Tue", "10:30", "11:00", specialty="cardiology")) == [1, 4]
+    assert ids(index.available(1, 630, city="PUNE")) == [1, 3]
+    assert ids(index.available("Tue", "16:30", "17:15")) == []
+    assert ids(index.available("Sun", "10:00")) == [7]
+    assert index.available("Tue", "10:30", specialty="Unknown") == []
+
+
+def test_available_respects_limit():
+    index = AvailabilityIndex()
+    index.load([doctor(i) for i in range(1, 11)])
+    assert len(index.available("Mon", "10:00", limit=3)) == 3
+
+
+def test_large_schedule_groups_match_small_ones():
+    # Groups of 64+ identical schedules take the merged-bitmap path in _build
+    index = AvailabilityIndex()
+    index.load([doctor(i) for i in range(1, 101)] + [doctor(101, start="13:00")])
+    assert len(index.available("Wed", "10:00")) == 100
+    assert len(index.available("Wed", "14:00")) == 101
+
+
+def test_upsert_and_update():
+    index = AvailabilityIndex()
+    index.load([doctor(1), doctor(2)])
+
+    index.upsert(3, doctor(3))
+    assert ids(index.available("Mon", "10:00")) == [1, 2, 3]
+
+    index.update(2, {"available_from": "12:00"})
+    assert ids(index.available("Mon", "10:00")) == [1, 3]
+    assert ids(index.available("Mon", "12:00")) == [1, 2, 3]
+
+    index.update(1, {"approved": False})
+    index.update(3, {"suspended": True})
+    assert ids(index.available("Mon", "12:00")) == [2]
+
+    index.upsert(4, doctor(4))
+    index.update(3, {"suspended": False})
+    assert ids(index.available("Mon", "12:00")) == [2, 3, 4]
+    assert len(index) == 4
+
+
+def test_upsert_is_ignored_before_the_first_load():
+    index = AvailabilityIndex()
+    index.upsert(1, doctor(1))
+    assert not index.is_loaded
+    assert len(index) == 0
+
+
+def test_update_of_unknown_doctor_invalidates():
+    index = AvailabilityIndex()
+    index.load([doctor(1)])
+    index.update(99, {"approved": True})
+    assert not index.is_loaded
+
+
+def test_ensure_loaded_respects_ttl_and_invalidate():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [doctor(1)]
+
+    index = AvailabilityIndex()
+    index.ensure_loaded(loader)
+    index.ensure_loaded(loader)
+    assert len(calls) == 1
+
+    index.invalidate()
+    index.ensure_loaded(loader)
+    assert len(calls) == 2
+
+
+def test_reload_does_not_block_queries_and_replays_writes():
+    index = AvailabilityIndex()
+    index.load([doctor(1)])
+    index.invalidate()
+
+    fetching = threading.Event()
+    finish = threading.Event()
+
+    def slow_loader():
+        fetching.set()
+        finish.wait(5)
+        return [doctor(1), doctor(2)]
+
+    reload = threading.Thread(target=index.ensure_loaded, args=(slow_loader,))
+    reload.start()
+    assert fetching.wait(5)
+
+    # While the loader runs, the old index still answers and accepts writes
+    assert ids(index.available("Mon", "10:00")) == [1]
+    index.upsert(2, {"available_from": "12:00"})
+    index.upsert(3, doctor(3))
+    index.update(1, {"approved": False})
+
+    finish.set()
+    reload.join(5)
+    assert index.is_loaded
+    assert ids(index.available("Mon", "10:00")) == [3]
+    assert ids(index.available("Mon", "12:00")) == [2, 3]
+
+
+def test_expired_index_is_served_while_another_thread_reloads(monkeypatch):
+    index = AvailabilityIndex()
+    index.load([doctor(1)])
+    monkeypatch.setattr("availability.INDEX_TTL", 0)
+
+    fetching = threading.Event()
+    finish = threading.Event()
+
+    def slow_loader():
+        fetching.set()
+        finish.wait(5)
+        return [doctor(1), doctor(2)]
+
+    reload = threading.Thread(target=index.ensure_loaded, args=(slow_loader,))
+    reload.start()
+    assert fetching.wait(5)
+    try:
+        index.ensure_loaded(lambda: pytest.fail("second reload started"))
+        assert ids(index.available("Mon", "10:00")) == [1]
+    finally:
+        finish.set()
+        reload.join(5)
+    assert ids(index.available("Mon", "10:00")) == [1, 2]
+
+
+def test_failed_reload_keeps_the_current_index():
+    index = AvailabilityIndex()
+    index.load([doctor(1)])
+    index.invalidate()
+
+    def broken_loader():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        index.ensure_loaded(broken_loader)
+    assert ids(index.available("Mon", "10:00")) == [1]
+    index.upsert(2, doctor(2))
+    assert index._pending is None
@@ -0,0 +1,261 @@
+# tests/test_bulk_import.py
+import time
+
+import bcrypt
+import pytest
+
+import bulk_import
+from db import DeadlineExceeded, fresh_deadline, request_deadline
+
+HASH = bcrypt.hashpw(b"secret123", bcrypt.gensalt(4)).decode()
+
+
+def doctor_row(n, **fields):
+    row = {
+        "full_name": f"Doctor {n}", "email": f"doc{n}@example.com", "password_hash": HASH,
+        "mobile": "9876543210", "gender": "MALE", "location": "Pune",
+        "registration_number": f"REG-{n}", "council": "MMC", "degree": "MBBS",
+        "specialty": "Cardiology", "experience": "5", "clinic_name": "Clinic",
+        "clinic_address": "Pune",
+    }
+    row.update(fields)
+    return row
+
+
+def patient_row(n, **fields):
+    row = {"fullName": f"Patient {n}", "email": f"pat{n}@example.com", "password_hash": HASH, "mobile": "9876543210"}
+    row.update(fields)
+    return row
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(sql)
+        if sql.startswith("SELECT"):
+            self._rows = [(self.conn.ids[e], e) for e in params if e in self.conn.ids]
+            return
+        if self.conn.fail:
+            raise RuntimeError("Data too long for column 'mobile'")
+        emails = [p for p in params if isinstance(p, str) and p.endswith("@example.com")]
+        created = [e for e in emails if e not in self.conn.existing]
+        self.rowcount = len(created)
+        for email in created:
+            self.conn.ids[email] = self.lastrowid = len(self.conn.ids) + 100
+        if self.conn.in_transaction is not None:
+            self.conn.in_transaction.extend(created)
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, existing=(), fail=False):
+        self.existing = set(existing)
+        self.fail = fail
+        self.ids = {}
+        self.statements = []
+        self.options = None
+        self.in_transaction = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.existing.update(self.in_transaction)
+        self.in_transaction = []
+
+    def rollback(self):
+        for email in self.in_transaction:
+            self.ids.pop(email, None)
+        self.in_transaction = []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conn = FakeConnection()
+
+    def connect(**options):
+        conn.options = options
+        return conn
+
+    monkeypatch.setattr(bulk_import, "get_db_connection", connect)
+    return conn
+
+
+def statuses(result):
+    return [row["status"] for row in result["rows"]]
+
+
+def test_parse_rows_csv_and_ndjson():
+    assert bulk_import.parse_rows("email,mobile\n a@b.co , \n", "csv") == [{"email": "a@b.co", "mobile": None}]
+    rows = bulk_import.parse_rows('{"email": "a@b.co"}\n\nnot json\n', "ndjson")
+    assert rows[0] == {"email": "a@b.co"}
+    assert rows[1]["_error"].startswith("line 3:")
+    with pytest.raises(ValueError):
+        bulk_import.parse_rows("", "xml")
+
+
+def test_all_new_rows_are_created_in_one_statement(db):
+    result = bulk_import.import_rows("doctors", [doctor_row(1), doctor_row(2)])
+    assert statuses(result) == ["created", "created"]
+    assert [row["id"] for row in result["rows"]] == [100, 101]
+    assert sum(s.startswith("INSERT") for s in db.statements) == 1
+    assert all("ON DUPLICATE KEY UPDATE id = id" in s for s in db.statements if s.startswith("INSERT"))
+    assert db.options == {"client_flags": [-bulk_import.ClientFlag.FOUND_ROWS]}
+
+
+def test_mixed_batch_is_resolved_row_by_row(db):
+    db.existing.add("doc2@example.com")
+    result = bulk_import.import_rows("doctors", [doctor_row(1), doctor_row(2), doctor_row(3)])
+    assert statuses(result) == ["created", "duplicate", "created"]
+    assert result["summary"]["created"] == 2
+
+
+def test_invalid_and_repeated_rows_are_reported(db):
+    result = bulk_import.import_rows("doctors", [
+        doctor_row(1), doctor_row(1), doctor_row(2, password_hash="plain"), "not an object",
+        doctor_row(3, password_hash=None, password="\u00e9" * 40),
+    ])
+    assert statuses(result) == ["created", "duplicate", "invalid", "invalid", "invalid"]
+    assert result["rows"][2]["errors"] == {"password_hash": "must be a bcrypt hash"}
+    assert result["rows"][4]["errors"] == {"password": "must be at most 72 bytes long"}
+
+
+def test_failed_batch_is_reported_and_later_batches_still_run(db, monkeypatch):
+    calls = []
+    insert = bulk_import._insert_batch
+
+    def flaky_insert(table, columns, batch):
+        calls.append(len(batch))
+        db.fail = len(calls) == 1
+        return insert(table, columns, batch)
+
+    monkeypatch.setattr(bulk_import, "_insert_batch", flaky_insert)
+    result = bulk_import.import_rows("doctors", [doctor_row(n) for n in range(1, 6)], batch_size=2)
+    assert statuses(result) == ["failed", "failed", "created", "created", "created"]
+    assert "Data too long" in result["rows"][0]["error"]
+    assert result["summary"]["failed"] == 2
+
+
+def test_batches_that_would_overrun_the_deadline_are_skipped(db, monkeypatch):
+    insert = bulk_import._insert_batch
+
+    def slow_insert(table, columns, batch):
+        insert(table, columns, batch)
+        # The first batch used up most of the budget
+        request_deadline.set(time.monotonic() + 0.01)
+        time.sleep(0.02)
+
+    monkeypatch.setattr(bulk_import, "_insert_batch", slow_insert)
+    with fresh_deadline(60):
+        result = bulk_import.import_rows("doctors", [doctor_row(n) for n in range(1, 6)], batch_size=2)
+    assert statuses(result) == ["created", "created", "skipped", "skipped", "skipped"]
+    assert result["summary"]["skipped"] == 3
+
+
+def test_deadline_exceeded_inside_a_batch_skips_the_rest(db, monkeypatch):
+    def timed_out(table, columns, batch):
+        raise DeadlineExceeded("no connection slot in time")
+
+    monkeypatch.setattr(bulk_import, "_insert_batch", timed_out)
+    with fresh_deadline(60):
+        result = bulk_import.import_rows("doctors", [doctor_row(1), doctor_row(1), doctor_row(2)])
+    assert statuses(result) == ["skipped", "duplicate", "skipped"]
+
+
+class FakeShards:
+    """Patient directory and shard connections for ``_insert_patient_batch``."""
+
+    def __init__(self, monkeypatch, shards=2):
+        self.shards = shards
+        self.rows = {shard: [] for shard in range(shards)}
+        self.failing = {}  # shard -> exception raised by its INSERT
+        self.released = []
+        monkeypatch.setattr(bulk_import, "allocate_many", self.allocate_many)
+        monkeypatch.setattr(bulk_import, "release", self.released.extend)
+        monkeypatch.setattr(bulk_import, "get_shard_connection", self.connect)
+
+    def allocate_many(self, emails):
+        return {email: (int(email[3:-12]), int(email[3:-12]) % self.shards) for email in emails}
+
+    def connect(self, shard):
+        if shard in self.failing:
+            raise self.failing[shard]
+        return FakeShardConnection(self.rows[shard])
+
+
+class FakeShardConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        self.rows.append(params)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_patient_rows_are_written_per_shard(monkeypatch):
+    shards = FakeShards(monkeypatch)
+    result = bulk_import.import_rows("patients", [patient_row(n) for n in range(1, 5)])
+    assert statuses(result) == ["created"] * 4
+    assert [row["id"] for row in result["rows"]] == [1, 2, 3, 4]
+    assert [len(inserts) for inserts in shards.rows.values()] == [1, 1]
+    assert shards.released == []
+
+
+def test_failing_shard_fails_and_releases_only_its_own_patients(monkeypatch):
+    shards = FakeShards(monkeypatch, shards=3)
+    shards.failing[1] = RuntimeError("Lost connection to MySQL server")
+    result = bulk_import.import_rows("patients", [patient_row(n) for n in range(1, 7)])
+    assert statuses(result) == ["failed", "created", "created", "failed", "created", "created"]
+    assert "Lost connection" in result["rows"][0]["error"]
+    assert shards.released == [1, 4]
+
+
+def test_existing_patient_emails_are_duplicates(monkeypatch):
+    shards = FakeShards(monkeypatch)
+    allocate_many = shards.allocate_many
+    monkeypatch.setattr(bulk_import, "allocate_many",
+                        lambda emails: {e: p for e, p in allocate_many(emails).items() if e != "pat2@example.com"})
+    result = bulk_import.import_rows("patients", [patient_row(1), patient_row(2, email="PAT2@example.com")])
+    assert statuses(result) == ["created", "duplicate"]
+    assert shards.released == []
+
+
+def test_deadline_exceeded_on_a_shard_skips_patients_and_releases_their_ids(monkeypatch):
+    shards = FakeShards(monkeypatch)
+    shards.failing[0] = DeadlineExceeded("no connection slot in time")
+    with fresh_deadline(60):
+        result = bulk_import.import_rows("patients", [patient_row(n) for n in range(1, 6)], batch_size=4)
+    # Shard 1 (ids 1, 3) is written first; shard 0 (2, 4) and the next batch (5) run out of time
+    assert statuses(result) == ["created", "skipped", "created", "skipped", "skipped"]
+    assert result["summary"]["failed"] == 0
+    assert shards.released == [2, 4]
+
+
+def test_passwords_are_hashed_per_batch(db, monkeypatch):
+    batches = []
+    monkeypatch.setattr(bulk_import, "hash_passwords", lambda ps: batches.append(list(ps)) or [HASH] * len(ps))
+    rows = [doctor_row(n, password_hash=None, password=f"secret{n}") for n in range(1, 4)]
+    result = bulk_import.import_rows("doctors", rows, batch_size=2)
+    assert batches == [["secret1", "secret2"], ["secret3"]]
+    assert statuses(result) == ["created"] * 3
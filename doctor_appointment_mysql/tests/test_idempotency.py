@@ -0,0 +1,218 @@
+# tests/test_idempotency.py
+import datetime
+import time
+
+import mysql.connector
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, decode_token
+
+import idempotency
+from db import DeadlineExceeded, remaining_budget, request_deadline
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-for-idempotency-tests-0123456789"
+    JWTManager(app)
+    return app
+
+
+def fingerprint(app, **kwargs):
+    with app.test_request_context("/api/patient/register", method="POST", **kwargs):
+        return idempotency._fingerprint()
+
+
+def test_fingerprint_ignores_key_order_but_not_password(app):
+    a = fingerprint(app, json={"email": "a@b.co", "fullName": "A", "password": "secret1"})
+    b = fingerprint(app, json={"fullName": "A", "password": "secret1", "email": "a@b.co"})
+    c = fingerprint(app, json={"email": "a@b.co", "fullName": "A", "password": "other-password"})
+    assert a == b
+    assert a != c
+
+
+def test_fingerprint_covers_form_fields(app):
+    a = fingerprint(app, data={"fullName": "A", "password": "secret1"})
+    assert a == fingerprint(app, data={"fullName": "A", "password": "secret1"})
+    assert a != fingerprint(app, data={"fullName": "A", "password": "secret2"})
+    assert a != fingerprint(app, data={"fullName": "B", "password": "secret1"})
+
+
+def test_fingerprint_is_keyed(app, monkeypatch):
+    before = fingerprint(app, json={"email": "a@b.co"})
+    monkeypatch.setenv("IDEMPOTENCY_SECRET", "another-secret")
+    assert fingerprint(app, json={"email": "a@b.co"}) != before
+
+
+def test_stored_body_has_no_token_and_replay_mints_a_new_one(app):
+    with app.test_request_context():
+        token = create_access_token(
+            identity="42", additional_claims={"email": "a@b.co", "role": "PATIENT"},
+            expires_delta=datetime.timedelta(days=1)
+        )
+        response = jsonify({"message": "Registered", "token": token})
+
+        stored = idempotency._storable_body(response)
+        assert token.encode() not in stored
+        assert b"42" in stored
+
+        replayed = app.json.loads(idempotency._replay_body(stored))
+        assert replayed["message"] == "Registered"
+        claims = decode_token(replayed["token"])
+        assert claims["sub"] == "42"
+        assert claims["email"] == "a@b.co"
+        assert claims["role"] == "PATIENT"
+        assert claims["exp"] - claims["iat"] == 86400
+        assert claims["jti"] != decode_token(token)["jti"]
+
+
+def test_bodies_without_token_are_stored_as_is(app):
+    with app.test_request_context():
+        response = jsonify({"message": "Profile updated"})
+        body = response.get_data()
+        assert idempotency._storable_body(response) == body
+        assert idempotency._replay_body(body) == body
+
+
+# ---------------------------
+# Decorator
+# ---------------------------
+class FakeStore:
+    """Just enough of the idempotency_keys table for the decorator."""
+
+    def __init__(self):
+        self.rows = {}
+        self.deadlines = []
+
+    def connect(self):
+        self.deadlines.append(remaining_budget())
+        if self.deadlines[-1] is not None and self.deadlines[-1] <= 0:
+            raise DeadlineExceeded("out of time")
+        return FakeStoreConnection(self)
+
+
+class FakeStoreConnection:
+    def __init__(self, store):
+        self.store = store
+
+    def cursor(self, dictionary=False):
+        return FakeStoreCursor(self.store)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeStoreCursor:
+    def __init__(self, store):
+        self.rows = store.rows
+        self.rowcount = 0
+        self._row = None
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT INTO idempotency_keys"):
+            if params[0] in self.rows:
+                raise mysql.connector.IntegrityError("duplicate key")
+            self.rows[params[0]] = {
+                "fingerprint": params[1], "status": "IN_PROGRESS", "response_status": None,
+                "response_body": None, "content_type": None, "expires_at": 2e9,
+            }
+        elif sql.startswith("UPDATE idempotency_keys SET status = 'COMPLETED'"):
+            self.rows[params[3]].update(
+                status="COMPLETED", response_status=params[0], response_body=params[1], content_type=params[2]
+            )
+        elif sql.startswith("SELECT"):
+            self._row = self.rows.get(params[0])
+        elif sql.startswith("DELETE FROM idempotency_keys WHERE key_hash"):
+            self.rows.pop(params[0], None)
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(idempotency, "get_db_connection", store.connect)
+    idempotency._completed.clear()
+    yield store
+    request_deadline.set(None)
+
+
+def test_replay_returns_first_response_without_running_the_view(app, store):
+    calls = []
+
+    @app.route("/register", methods=["POST"])
+    @idempotency.idempotent("test.register")
+    def register():
+        calls.append(1)
+        return jsonify(message="Registered", token=create_access_token(identity="7")), 200
+
+    client = app.test_client()
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/register", json={"email": "a@b.co"}, headers=headers)
+    idempotency._completed.clear()  # force the shared store path
+    second = client.post("/register", json={"email": "a@b.co"}, headers=headers)
+    other = client.post("/register", json={"email": "c@d.co"}, headers=headers)
+
+    assert calls == [1]
+    assert second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json["token"] != first.json["token"]
+    assert other.status_code == 422
+
+
+def test_replay_with_another_password_is_rejected(app, store):
+    calls = []
+
+    @app.route("/register", methods=["POST"])
+    @idempotency.idempotent("test.register")
+    def register():
+        calls.append(1)
+        return jsonify(message="Registered", token=create_access_token(identity="7")), 201
+
+    client = app.test_client()
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/register", json={"email": "a@b.co", "password": "secret1"}, headers=headers)
+    guess = client.post("/register", json={"email": "a@b.co", "password": "guess123"}, headers=headers)
+
+    assert first.status_code == 201
+    assert guess.status_code == 422
+    assert "token" not in guess.json
+    assert calls == [1]
+
+
+def test_outcome_is_recorded_after_the_view_used_up_the_deadline(app, store):
+    @app.route("/update", methods=["POST"])
+    @idempotency.idempotent("test.update")
+    def update():
+        request_deadline.set(time.monotonic() - 1)  # committed, but out of time
+        return jsonify(message="Updated"), 200
+
+    response = app.test_client().post("/update", json={"a": 1}, headers={"Idempotency-Key": "k"})
+    assert response.status_code == 200
+    assert [row["status"] for row in store.rows.values()] == ["COMPLETED"]
+    assert store.deadlines[-1] > 0
+
+
+def test_key_is_released_when_the_view_fails_after_its_deadline(app, store):
+    @app.route("/fail", methods=["POST"])
+    @idempotency.idempotent("test.fail")
+    def fail():
+        request_deadline.set(time.monotonic() - 1)
+        raise DeadlineExceeded("out of time")
+
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    response = app.test_client().post("/fail", json={}, headers={"Idempotency-Key": "k"})
+    assert response.status_code == 500
+    assert store.rows == {}
@@ -0,0 +1,125 @@
+# tests/test_overload.py
+import time
+
+import mysql.connector
+import pytest
+from flask import Flask, jsonify
+
+import db
+import overload
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(overload, "limiter", overload.AdaptiveLimiter())
+    app = Flask(__name__)
+    app.config["REQUEST_DEADLINES"] = {"default": 0.05, "slow": 1.0}
+    overload.init_app(app)
+
+    @app.route("/late-validation-error")
+    def late_validation_error():
+        time.sleep(0.06)
+        return jsonify(error="Validation failed"), 400
+
+    @app.route("/out-of-time")
+    def out_of_time():
+        raise db.DeadlineExceeded("no connection slot in time")
+
+    return app
+
+
+def test_late_errors_are_not_rewritten(app):
+    response = app.test_client().get("/late-validation-error")
+    assert response.status_code == 400
+    assert response.json == {"error": "Validation failed"}
+    assert overload.limiter.stats()["timed_out"] == 0
+
+
+def test_deadline_exceeded_becomes_504(app):
+    response = app.test_client().get("/out-of-time")
+    assert response.status_code == 504
+    assert overload.limiter.stats()["timed_out"] == 1
+    assert overload.limiter.stats()["in_flight"] == 0
+
+
+def test_deadline_is_cleared_after_the_request(app):
+    app.test_client().get("/late-validation-error")
+    assert db.request_deadline.get() is None
+
+
+def test_checked_reports_query_timeouts_as_deadline_exceeded():
+    def query_timeout():
+        raise mysql.connector.DatabaseError(msg="maximum statement execution time exceeded",
+                                            errno=db.ER_QUERY_TIMEOUT)
+
+    with pytest.raises(db.DeadlineExceeded):
+        db._checked(query_timeout)
+
+
+def test_checked_keeps_other_errors_while_there_is_time():
+    def duplicate():
+        raise mysql.connector.IntegrityError(msg="Duplicate entry", errno=1062)
+
+    with pytest.raises(mysql.connector.IntegrityError):
+        db._checked(duplicate)
+    with db.fresh_deadline(-1), pytest.raises(db.DeadlineExceeded):
+        db._checked(duplicate)
+    assert db.request_deadline.get() is None
+
+
+# ---------------------------
+# Admission control
+# ---------------------------
+def test_limiter_grows_on_fast_completions_and_shrinks_on_slow_ones():
+    limiter = overload.AdaptiveLimiter(initial=10)
+    for _ in range(10):
+        assert limiter.try_acquire()
+        limiter.release(slow=False, timed_out=False)
+    assert limiter.limit > 10
+
+    limiter.try_acquire()
+    limiter.release(slow=True, timed_out=False)
+    assert limiter.limit < 10
+
+
+def test_limiter_sheds_beyond_its_limit():
+    limiter = overload.AdaptiveLimiter(initial=2, minimum=1)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.stats()["shed"] == 1
+
+
+def test_pool_wait_lowers_the_limit_instead_of_rejecting_everything(monkeypatch):
+    monkeypatch.setattr(overload, "connection_wait_ewma", lambda: overload.POOL_WAIT_SHED * 2)
+    monkeypatch.setattr(overload, "DECREASE_INTERVAL", 0)
+    limiter = overload.AdaptiveLimiter(initial=10, minimum=4)
+
+    admitted = [limiter.try_acquire() for _ in range(10)]
+    assert admitted[:4] == [True] * 4
+    assert not all(admitted)
+    assert limiter.limit == 4
+    assert limiter.stats()["shed"] == admitted.count(False)
+
+
+def test_admission_exempt_endpoints_skip_the_limiter(app, monkeypatch):
+    app.config["ADMISSION_EXEMPT"] = {"in_memory"}
+
+    @app.route("/in-memory")
+    def in_memory():
+        return {"doctors": []}
+
+    @app.route("/db-bound")
+    def db_bound():
+        return {"rows": []}
+
+    monkeypatch.setattr(overload.limiter, "try_acquire", lambda: False)
+    client = app.test_client()
+    assert client.get("/in-memory").status_code == 200
+    response = client.get("/db-bound")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_default_exempt_endpoints_exist():
+    from app import app as application
+    assert overload.DEFAULT_ADMISSION_EXEMPT <= set(application.view_functions)
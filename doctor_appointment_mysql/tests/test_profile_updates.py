@@ -0,0 +1,148 @@
+# tests/test_profile_updates.py
+import datetime
+import decimal
+
+import pytest
+
+import profile_updates
+from profile_updates import CONFLICT, NOT_FOUND, UNCHANGED, UPDATED, diff, parse_version, save_profile
+
+STAMP = datetime.datetime(2024, 5, 1, 10, 30, 15)
+
+
+@pytest.mark.parametrize("current, new", [
+    (None, None),
+    ("Pune", "Pune"),
+    (b"Pune", "Pune"),
+    (datetime.timedelta(hours=9), "09:00"),
+    (datetime.timedelta(hours=9, minutes=30), "9:30:00"),
+    (datetime.date(1990, 2, 28), "1990-02-28"),
+    (STAMP, "2024-05-01T10:30:15"),
+    (12, "12"),
+    (12, " 12 "),
+    (decimal.Decimal("12.50"), "12.5"),
+    (1, 1),
+])
+def test_same(current, new):
+    assert profile_updates._same(current, new)
+
+
+@pytest.mark.parametrize("current, new", [
+    (None, ""),
+    ("", None),
+    ("Pune", "pune"),
+    (datetime.timedelta(hours=9), "09:15"),
+    (datetime.timedelta(hours=9), "nine"),
+    (datetime.date(1990, 2, 28), "1990-03-01"),
+    (12, "twelve"),
+    (1, True),
+])
+def test_not_same(current, new):
+    assert not profile_updates._same(current, new)
+
+
+def test_diff_keeps_only_changed_columns():
+    current = {"city": "Pune", "available_from": datetime.timedelta(hours=9), "experience": 5}
+    incoming = {"city": "Pune", "available_from": "10:00", "experience": "5"}
+    assert diff(current, incoming) == {"available_from": "10:00"}
+
+
+def test_parse_version():
+    assert parse_version(None) is None
+    assert parse_version("") is None
+    assert parse_version("Wed, 01 May 2024 10:30:15 GMT") == STAMP
+    assert parse_version("2024-05-01T10:30:15Z") == STAMP
+    assert parse_version("2024-05-01 10:30:15") == STAMP
+
+
+@pytest.mark.parametrize("value", ["yesterday", "2024-13-01", "Wed, 99 May"])
+def test_parse_version_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_version(value)
+
+
+# ---------------------------
+# save_profile
+# ---------------------------
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, sql, params):
+        self.conn.statements.append((sql, list(params)))
+        if sql.startswith("UPDATE"):
+            self.rowcount = 0 if self.conn.lose_race else 1
+
+    def fetchone(self):
+        return dict(self.conn.row) if self.conn.row else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, row, lose_race=False):
+        self.row = row
+        self.lose_race = lose_race
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch):
+    monkeypatch.setattr(profile_updates, "_counters", {})
+
+
+def row(**fields):
+    return dict({"city": "Pune", "mobile": "98765", "updated_at": STAMP}, **fields)
+
+
+def test_unchanged_save_does_not_write():
+    conn = FakeConnection(row())
+    status, changes, version = save_profile(conn, "patient", 1, {"city": "Pune", "mobile": "98765"})
+    assert (status, changes, version) == (UNCHANGED, {}, STAMP)
+    assert len(conn.statements) == 1
+    assert conn.commits == 0
+
+
+def test_changed_columns_are_written_with_a_compare_and_set():
+    conn = FakeConnection(row())
+    status, changes, _ = save_profile(conn, "patient", 1, {"city": "Mumbai", "mobile": "98765"})
+    assert (status, changes) == (UPDATED, {"city": "Mumbai"})
+    sql, params = conn.statements[-1]
+    assert sql == ("UPDATE patient SET city = %s, updated_at = NOW() "
+                   "WHERE id = %s AND updated_at <=> %s AND city <=> %s")
+    assert params == ["Mumbai", 1, STAMP, "Pune"]
+
+
+def test_lost_race_is_a_conflict():
+    conn = FakeConnection(row(), lose_race=True)
+    status, _, version = save_profile(conn, "patient", 1, {"city": "Mumbai"})
+    assert (status, version) == (CONFLICT, STAMP)
+
+
+def test_stale_client_version_is_a_conflict():
+    conn = FakeConnection(row())
+    older = STAMP - datetime.timedelta(minutes=1)
+    assert save_profile(conn, "patient", 1, {"city": "Mumbai"}, version=older)[0] == CONFLICT
+    assert save_profile(conn, "patient", 1, {"city": "Mumbai"}, version=STAMP)[0] == UPDATED
+
+
+def test_missing_row():
+    assert save_profile(FakeConnection(None), "patient", 1, {"city": "Pune"})[0] == NOT_FOUND
+
+
+def test_stats_report_skipped_ratios():
+    save_profile(FakeConnection(row()), "doctors", 1, {"city": "Pune", "mobile": "98765"})
+    save_profile(FakeConnection(row()), "doctors", 1, {"city": "Mumbai", "mobile": "98765"})
+    stats = profile_updates.stats()["doctors"]
+    assert stats["saves"] == 2
+    assert stats["skipped_ratio"] == 0.5
+    assert stats["columns_skipped_ratio"] == 0.75
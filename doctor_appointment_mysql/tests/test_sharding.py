@@ -0,0 +1,255 @@
+# tests/test_sharding.py
+import bcrypt
+import mysql.connector
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+import patient
+import setup_shards
+import sharding
+
+
+class FakeDirectory:
+    """Just enough of the patient_directory table for sharding.py."""
+
+    def __init__(self):
+        self.rows = {}  # id -> [email, shard]
+        self.next_id = 1
+        self.queries = 0
+
+    def connect(self):
+        return FakeDirectoryConnection(self)
+
+    def insert(self, email, shard):
+        if any(e == email.lower() for e, _ in self.rows.values()):
+            raise mysql.connector.IntegrityError("Duplicate entry for key 'uq_patient_directory_email'")
+        row_id, self.next_id = self.next_id, self.next_id + 1
+        self.rows[row_id] = [email.lower(), shard]
+        return row_id
+
+
+class FakeDirectoryConnection:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def cursor(self):
+        return FakeDirectoryCursor(self.directory)
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDirectoryCursor:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        rows = self.directory.rows
+        self.directory.queries += 1
+        if sql.startswith("INSERT INTO patient_directory"):
+            self.lastrowid = self.directory.insert(*params)
+        elif sql.startswith("INSERT IGNORE INTO patient_directory"):
+            for email, shard in zip(params[::2], params[1::2]):
+                try:
+                    self.directory.insert(email, shard)
+                except mysql.connector.IntegrityError:
+                    pass
+        elif sql.startswith("SELECT email FROM patient_directory WHERE email IN"):
+            self._rows = [(email,) for email, _ in rows.values() if email in {p.lower() for p in params}]
+        elif sql.startswith("SELECT id, email, shard FROM patient_directory WHERE email IN"):
+            self._rows = [(i, email, shard) for i, (email, shard) in rows.items()
+                          if email in {p.lower() for p in params}]
+        elif sql.startswith("SELECT email, shard FROM patient_directory WHERE id"):
+            self._rows = [tuple(rows[params[0]])] if params[0] in rows else []
+        elif sql.startswith("SELECT id, shard FROM patient_directory WHERE email"):
+            self._rows = [(i, shard) for i, (email, shard) in rows.items() if email == params[0]]
+        elif sql.startswith("DELETE FROM patient_directory"):
+            for row_id in params:
+                rows.pop(row_id, None)
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    directory = FakeDirectory()
+    monkeypatch.setattr(sharding, "get_db_connection", directory.connect)
+    sharding._by_id.clear()
+    sharding._by_email.clear()
+    yield directory
+    sharding._by_id.clear()
+    sharding._by_email.clear()
+
+
+def test_new_patients_are_placed_by_email_hash(directory):
+    placements = [sharding.allocate(f"p{n}@example.com") for n in range(20)]
+    assert [patient_id for patient_id, _ in placements] == list(range(1, 21))
+    for n, (_, shard) in enumerate(placements):
+        assert shard == sharding.shard_for_email(f"P{n}@Example.com")
+        assert 0 <= shard < sharding.SHARD_COUNT
+
+
+def test_directory_lookups_are_cached(directory):
+    directory.insert("a@b.co", 0)
+    sharding.release([])  # no-op, no query
+    assert directory.queries == 0
+
+    assert sharding.locate_email("A@B.co") == (1, 0)
+    assert sharding.shard_for_id(1) == 0
+    assert sharding.shard_for_id("1") == 0
+    assert directory.queries == 1
+    assert sharding.shard_for_id(2) is None
+    assert sharding.locate_email("x@y.co") is None
+
+
+def test_duplicate_email_is_not_allocated(directory):
+    assert sharding.allocate("a@b.co") is not None
+    assert sharding.allocate("a@b.co") is None
+    assert len(directory.rows) == 1
+
+
+def test_allocate_many_skips_existing_emails(directory):
+    existing, _ = sharding.allocate("a@b.co")
+    allocated = sharding.allocate_many(["a@b.co", "c@d.co", "e@f.co"])
+    assert set(allocated) == {"c@d.co", "e@f.co"}
+    assert existing not in {patient_id for patient_id, _ in allocated.values()}
+    assert sharding.allocate_many([]) == {}
+
+
+def test_release_clears_directory_and_both_caches(directory):
+    kept, _ = sharding.allocate("keep@b.co")
+    released, _ = sharding.allocate("a@b.co")
+    sharding.shard_for_id(released)
+    sharding.locate_email("a@b.co")
+
+    sharding.release([released])
+    assert list(directory.rows) == [kept]
+    assert released not in sharding._by_id
+    assert "a@b.co" not in sharding._by_email
+    assert "keep@b.co" in sharding._by_email
+    assert sharding.shard_for_id(released) is None
+    assert sharding.locate_email("a@b.co") is None
+
+
+class FakeShardCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeShard:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def cursor(self, dictionary=False):
+        return FakeShardCursor(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+def test_fetch_all_patients_merges_shards_by_id(monkeypatch):
+    shards = [
+        FakeShard([{"id": 2}, {"id": 5}, {"id": 9}]),
+        FakeShard([{"id": 1}, {"id": 6}]),
+        FakeShard([{"id": 3}, {"id": 4}, {"id": 7}, {"id": 8}]),
+    ]
+    monkeypatch.setattr(sharding, "SHARD_COUNT", 3)
+    monkeypatch.setattr(sharding, "get_shard_connection", shards.__getitem__)
+    rows = sharding.fetch_all_patients("SELECT id FROM patient ORDER BY id")
+    assert [row["id"] for row in rows] == list(range(1, 10))
+    assert all(shard.closed for shard in shards)
+
+
+def test_setup_shards_runs_the_patient_table_from_schema_sql():
+    with open(setup_shards.SCHEMA_PATH, encoding="utf-8") as f:
+        statements = setup_shards.shard_statements(f.read())
+    assert len(statements) == 1
+    assert statements[0].startswith("CREATE TABLE IF NOT EXISTS patient (")
+    assert "UNIQUE KEY uq_patient_email (email)" in statements[0]
+
+
+def test_refresh_replaces_an_entry_released_elsewhere(directory):
+    patient_id, shard = sharding.allocate("a@b.co")
+    assert sharding.locate_email("a@b.co") == (patient_id, shard)
+
+    # Another worker released the entry and the patient registered again
+    del directory.rows[patient_id]
+    new_id = directory.insert("a@b.co", shard)
+
+    assert sharding.locate_email("a@b.co") == (patient_id, shard)
+    assert sharding.locate_email("a@b.co", refresh=True) == (new_id, shard)
+    assert sharding.locate_email("a@b.co") == (new_id, shard)
+
+
+def test_refresh_of_a_gone_email_returns_none(directory):
+    patient_id, _ = sharding.allocate("a@b.co")
+    del directory.rows[patient_id]
+    assert sharding.locate_email("a@b.co", refresh=True) is None
+    assert sharding.locate_email("a@b.co") is None
+
+
+# ---------------------------
+# Login
+# ---------------------------
+class FakeShardConnection:
+    def __init__(self, patients):
+        self.patients = patients
+        self._row = None
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params):
+        self._row = self.patients.get(params[0])
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+def test_login_looks_again_when_the_cached_patient_is_gone(directory, monkeypatch):
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-for-sharding-tests-0123456789"
+    JWTManager(app)
+    app.register_blueprint(patient.patient_bp)
+
+    stale_id, shard = sharding.allocate("a@b.co")
+    sharding.locate_email("a@b.co")
+    del directory.rows[stale_id]
+    new_id = directory.insert("a@b.co", shard)
+    patients = {new_id: {
+        "id": new_id, "full_name": "A", "email": "a@b.co", "role": "PATIENT",
+        "password": bcrypt.hashpw(b"secret123", bcrypt.gensalt(4)).decode(),
+    }}
+    monkeypatch.setattr(patient, "get_shard_connection", lambda shard: FakeShardConnection(patients))
+
+    response = app.test_client().post("/api/patient/login", json={"email": "a@b.co", "password": "secret123"})
+    assert response.status_code == 200
+    assert response.json["patient"]["id"] == new_id
@@ -0,0 +1,145 @@
+# tests/test_validation.py
+import pytest
+
+from validation import (
+    AVAILABILITY_QUERY, DOCTOR_REGISTER, DOCTOR_UPDATE, ID_QUERY, IMPORT_QUERY, LOGIN,
+    PATIENT_REGISTER, PATIENT_UPDATE, Field, Schema,
+)
+
+PATIENT = {
+    "fullName": "Asha Rao",
+    "email": "asha@example.com",
+    "password": "secret123",
+    "mobile": "9876543210",
+    "dateOfBirth": "1990-02-28",
+    "gender": "female",
+}
+
+DOCTOR = {
+    "full_name": "Dr. Meera Iyer",
+    "email": "meera@example.com",
+    "password": "secret123",
+    "mobile": "9876543210",
+    "gender": "FEMALE",
+    "location": "Pune",
+    "registration_number": "MH-12345",
+    "council": "Maharashtra Medical Council",
+    "degree": "MBBS, MD",
+    "specialty": "Cardiology",
+    "experience": 12,
+    "clinic_name": "Heart Care",
+    "clinic_address": "1 MG Road, Pune",
+    "available_days": "Mon-Fri",
+    "available_from": "09:00",
+    "available_to": "17:30",
+}
+
+
+def test_valid_payloads_pass():
+    assert PATIENT_REGISTER.validate(PATIENT) == {}
+    assert DOCTOR_REGISTER.validate(DOCTOR) == {}
+    assert LOGIN.validate({"email": "a@b.co", "password": "x"}) == {}
+
+
+def test_all_errors_are_reported_together():
+    errors = PATIENT_REGISTER.validate({"email": "not-an-email", "password": "123"})
+    assert errors == {
+        "fullName": "is required",
+        "email": "must be a valid email address",
+        "password": "must be at least 6 characters long",
+        "mobile": "is required",
+    }
+
+
+def test_empty_string_counts_as_missing():
+    assert PATIENT_REGISTER.validate(dict(PATIENT, mobile=""))["mobile"] == "is required"
+    assert PATIENT_UPDATE.validate({"mobile": ""}) == {}
+
+
+def test_payload_must_be_an_object():
+    assert LOGIN.validate(["email"]) == {"_payload": "must be an object"}
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("dateOfBirth", "1990-02-30", "must be a valid date"),
+    ("dateOfBirth", "30/01/1990", "must be a date in YYYY-MM-DD format"),
+    ("gender", "unknown", "must be one of: MALE, FEMALE, OTHER"),
+    ("gender", 1, "must be a string"),
+    ("fullName", ["A"], "must be a string or number"),
+    ("fullName", "x" * 101, "must be at most 100 characters long"),
+    ("password", "x" * 73, "must be at most 72 bytes long"),
+    ("password", "\u00e9" * 40, "must be at most 72 bytes long"),
+    ("password", 123456, "must be a string"),
+])
+def test_patient_field_errors(field, value, message):
+    assert PATIENT_REGISTER.validate(dict(PATIENT, **{field: value}))[field] == message
+
+
+def test_text_fields_accept_numbers():
+    assert PATIENT_REGISTER.validate(dict(PATIENT, mobile=9876543210)) == {}
+
+
+@pytest.mark.parametrize("field, value", [
+    ("available_days", "Mon-Funday"),
+    ("available_from", "25:00"),
+    ("available_to", "9am"),
+    ("dob", "yesterday"),
+])
+def test_doctor_field_errors(field, value):
+    assert field in DOCTOR_REGISTER.validate(dict(DOCTOR, **{field: value}))
+
+
+@pytest.mark.parametrize("schema, field", [(PATIENT_UPDATE, "updatedAt"), (DOCTOR_UPDATE, "updated_at")])
+def test_update_versions_must_parse(schema, field):
+    assert schema.validate({field: "Wed, 01 May 2024 10:30:15 GMT"}) == {}
+    assert schema.validate({field: "2024-05-01T10:30:15"}) == {}
+    assert field in schema.validate({field: "last tuesday"})
+
+
+def test_doctor_update_fields_are_optional():
+    assert DOCTOR_UPDATE.validate({"city": "Mumbai"}) == {}
+    assert DOCTOR_UPDATE.validate({}) == {}
+
+
+@pytest.mark.parametrize("day", ["Mon", "tuesday", "Th"])
+def test_availability_query_accepts_one_day(day):
+    assert AVAILABILITY_QUERY.validate({"day": day, "time": "10:30"}) == {}
+
+
+@pytest.mark.parametrize("day", ["Mon-Fri", "Mon,Tue", "Funday"])
+def test_availability_query_rejects_day_lists(day):
+    errors = AVAILABILITY_QUERY.validate({"day": day, "time": "10:30"})
+    assert list(errors) == ["day"]
+
+
+def test_availability_query_limits():
+    assert AVAILABILITY_QUERY.validate({"day": "Mon", "time": "10:30", "limit": "20"}) == {}
+    assert "limit" in AVAILABILITY_QUERY.validate({"day": "Mon", "time": "10:30", "limit": "-1"})
+
+
+@pytest.mark.parametrize("value, valid", [
+    ("42", True), (" 7 ", True), ("abc", False), ("1.5", False), ("\u00b2", False), ("\u0661\u0662", False),
+])
+def test_id_query(value, valid):
+    assert (ID_QUERY.validate({"id": value}) == {}) is valid
+
+
+def test_id_query_requires_id():
+    assert ID_QUERY.validate({}) == {"id": "is required"}
+
+
+def test_import_query():
+    assert IMPORT_QUERY.validate({}) == {}
+    assert IMPORT_QUERY.validate({"format": "ndjson"}) == {}
+    assert IMPORT_QUERY.validate({"format": "xml"}) == {"format": "must be one of: csv, ndjson"}
+
+
+def test_unknown_field_kind_is_rejected():
+    with pytest.raises(ValueError):
+        Field("uuid")
+
+
+def test_choices_can_ignore_case():
+    schema = Schema({"role": Field("string", choices=["ADMIN"], ignore_case=True)})
+    assert schema.validate({"role": "admin"}) == {}
+    assert schema.validate({"role": "root"}) == {"role": "must be one of: ADMIN"}
@@ -0,0 +1,362 @@
+# validation.py
+"""Declarative request validation shared by all blueprints.
+
+A ``Schema`` is a mapping of field name -> ``Field``. Each schema is compiled
+once at import into a flat list of small check functions (regexes compiled,
+choice lists turned into sets), so validating a request is a tight loop with
+no parsing or allocation beyond the error dict. All field errors are reported
+together.
+
+Views opt in with ``@validate_json(SCHEMA)`` / ``@validate_form(SCHEMA)``,
+which reject bad payloads with a 400 before any database or hashing work.
+"""
+import calendar
+import re
+from functools import wraps
+
+from flask import jsonify, request
+
+from availability import parse_day, parse_days
+from profile_updates import parse_version
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)(?::([0-5]\d))?$")
+INTEGER_RE = re.compile(r"[0-9]+")
+# bcrypt only takes this many bytes of a password (and rejects longer ones)
+BCRYPT_MAX_BYTES = 72
+
+
+# ---------------------------
+# Field checks
+# ---------------------------
+def _check_string(value):
+    if not isinstance(value, str):
+        return "must be a string"
+
+
+def _check_text(value):
+    # Free-form values: accept numbers too (mobile, zip, experience...)
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return "must be a string or number"
+
+
+def _check_integer(value):
+    if isinstance(value, bool):
+        return "must be an integer"
+    if isinstance(value, int):
+        return None
+    # Not str.isdigit(): it accepts digits such as "²" that int() rejects
+    if isinstance(value, str) and INTEGER_RE.fullmatch(value.strip()):
+        return None
+    return "must be an integer"
+
+
+def _check_password(value):
+    if not isinstance(value, str):
+        return "must be a string"
+    if len(value.encode("utf-8")) > BCRYPT_MAX_BYTES:
+        return f"must be at most {BCRYPT_MAX_BYTES} bytes long"
+
+
+def _check_email(value):
+    if not isinstance(value, str) or not EMAIL_RE.match(value):
+        return "must be a valid email address"
+
+
+def _check_date(value):
+    match = DATE_RE.match(value) if isinstance(value, str) else None
+    if not match:
+        return "must be a date in YYYY-MM-DD format"
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return "must be a valid date"
+
+
+def _check_time(value):
+    if not isinstance(value, str) or not TIME_RE.match(value):
+        return "must be a time in HH:MM format"
+
+
+def _check_day(value):
+    try:
+        parse_day(value)
+    except ValueError:
+        return "must be a single week day, e.g. \"Mon\" or \"Tuesday\""
+
+
+def _check_days(value):
+    try:
+        if not isinstance(value, str) or not parse_days(value):
+            raise ValueError
+    except ValueError:
+        return "must list week days, e.g. \"Mon,Wed,Fri\" or \"Mon-Fri\""
+
+
+def _check_version(value):
+    try:
+        if not isinstance(value, str):
+            raise ValueError
+        parse_version(value)
+    except ValueError:
+        return "must be the updated_at timestamp the profile was loaded with"
+
+
+KINDS = {
+    "string": _check_string,
+    "text": _check_text,
+    "integer": _check_integer,
+    "password": _check_password,
+    "email": _check_email,
+    "date": _check_date,
+    "time": _check_time,
+    "day": _check_day,
+    "days": _check_days,
+    "version": _check_version,
+}
+
+
+class Field:
+    """Declaration of one request field; compiled into a check by ``Schema``."""
+
+    def __init__(self, kind="text", required=False, min_length=None, max_length=None,
+                 choices=None, ignore_case=False):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown field kind: {kind}")
+        self.kind = kind
+        self.required = required
+        self.min_length = min_length
+        self.max_length = max_length
+        self.choices = choices
+        self.ignore_case = ignore_case
+
+    def as_required(self):
+        return Field(self.kind, True, self.min_length, self.max_length, self.choices, self.ignore_case)
+
+    def compile(self):
+        """Return a single ``check(value) -> error message or None`` function."""
+        low, high = self.min_length, self.max_length
+        allowed = message = None
+        if self.choices:
+            allowed = frozenset(c.upper() for c in self.choices) if self.ignore_case else frozenset(self.choices)
+            message = "must be one of: " + ", ".join(self.choices)
+        ignore_case = self.ignore_case
+
+        if self.kind in ("string", "text"):
+            # The common case, fused into one closure: type, length, choices
+            numbers_ok = self.kind == "text"
+
+            def check(value):
+                if type(value) is str:
+                    size = len(value)
+                elif numbers_ok and type(value) in (int, float):
+                    size = len(str(value))
+                else:
+                    return "must be a string or number" if numbers_ok else "must be a string"
+                if low is not None and size < low:
+                    return f"must be at least {low} characters long"
+                if high is not None and size > high:
+                    return f"must be at most {high} characters long"
+                if allowed is not None and (value.upper() if ignore_case else value) not in allowed:
+                    return message
+            return check
+
+        base = KINDS[self.kind]
+        if low is None and high is None and allowed is None:
+            return base
+
+        def check(value):
+            error = base(value)
+            if error:
+                return error
+            size = len(str(value))
+            if low is not None and size < low:
+                return f"must be at least {low} characters long"
+            if high is not None and size > high:
+                return f"must be at most {high} characters long"
+            if allowed is not None and (value.upper() if ignore_case else value) not in allowed:
+                return message
+        return check
+
+
+class Schema:
+    """A compiled set of ``Field`` declarations."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._checks = tuple((name, field.required, field.compile()) for name, field in fields.items())
+
+    def validate(self, data):
+        """Return a dict of ``{field: message}``; empty when ``data`` is valid."""
+        if not hasattr(data, "get"):
+            return {"_payload": "must be an object"}
+        errors = {}
+        for name, required, check in self._checks:
+            value = data.get(name)
+            if value is None or value == "":
+                if required:
+                    errors[name] = "is required"
+                continue
+            error = check(value)
+            if error:
+                errors[name] = error
+        return errors
+
+
+# ---------------------------
+# View decorators
+# ---------------------------
+def _reject(errors):
+    return jsonify({"error": "Validation failed", "fields": errors}), 400
+
+
+def validate_json(schema):
+    """Validate the JSON body against ``schema`` before running the view."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify({"error": "Invalid or missing JSON payload"}), 400
+            errors = schema.validate(data)
+            if errors:
+                return _reject(errors)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def validate_form(schema):
+    """Validate form fields (``multipart/form-data`` or urlencoded) against ``schema``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            errors = schema.validate(request.form)
+            if errors:
+                return _reject(errors)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def validate_args(schema):
+    """Validate query-string arguments against ``schema``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            errors = schema.validate(request.args)
+            if errors:
+                return _reject(errors)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------------------
+# Schemas
+# ---------------------------
+GENDERS = ["MALE", "FEMALE", "OTHER"]
+
+PATIENT_FIELDS = {
+    "dateOfBirth": Field("date"),
+    "gender": Field("string", choices=GENDERS, ignore_case=True),
+    "bloodGroup": Field(max_length=10),
+    "address": Field(max_length=500),
+    "emergencyContact": Field(max_length=20),
+    "city": Field(max_length=100),
+    "state": Field(max_length=100),
+    "zip": Field(max_length=20),
+    "country": Field(max_length=100),
+    "allergies": Field(),
+    "conditions": Field(),
+    "medications": Field(),
+    "surgeries": Field(),
+    "emergencyContactName": Field(max_length=100),
+    "emergencyContactNumber": Field(max_length=20),
+    "documentPath": Field(max_length=255),
+}
+
+PATIENT_REGISTER = Schema(dict(PATIENT_FIELDS, **{
+    "fullName": Field(required=True, max_length=100),
+    "email": Field("email", required=True, max_length=100),
+    "password": Field("password", required=True, min_length=6),
+    "mobile": Field(required=True, max_length=20),
+    "role": Field("string", choices=["PATIENT", "DOCTOR"]),
+}))
+
+PATIENT_UPDATE = Schema(dict(PATIENT_FIELDS, **{
+    "fullName": Field(max_length=100),
+    "mobile": Field(max_length=20),
+    "photoPath": Field(max_length=255),
+    "updatedAt": Field("version", max_length=64),
+}))
+
+DOCTOR_FIELDS = {
+    "full_name": Field(max_length=100),
+    "email": Field("email", max_length=100),
+    "mobile": Field(max_length=20),
+    "gender": Field("string", choices=GENDERS, ignore_case=True),
+    "location": Field(max_length=255),
+    "registration_number": Field(max_length=100),
+    "council": Field(max_length=255),
+    "degree": Field(max_length=255),
+    "specialty": Field(max_length=100),
+    "experience": Field(max_length=50),
+    "clinic_name": Field(max_length=255),
+    "clinic_address": Field(max_length=500),
+    "profile_photo": Field(max_length=255),
+    "dob": Field("date"),
+    "blood_group": Field(max_length=10),
+    "available_days": Field("days"),
+    "available_from": Field("time"),
+    "available_to": Field("time"),
+    "city": Field(max_length=100),
+    "state": Field(max_length=100),
+    "zip_code": Field(max_length=20),
+    "languages": Field(max_length=255),
+    "status": Field("string", max_length=20),
+    "documents": Field(),
+}
+
+DOCTOR_REGISTER = Schema(dict(DOCTOR_FIELDS, **{
+    name: DOCTOR_FIELDS[name].as_required()
+    for name in (
+        "full_name", "email", "mobile", "gender", "location", "registration_number",
+        "council", "degree", "specialty", "experience", "clinic_name", "clinic_address"
+    )
+}, **{
+    "password": Field("password", required=True, min_length=6),
+    "role": Field("string", choices=["DOCTOR"]),
+}))
+
+DOCTOR_UPDATE = Schema(dict(DOCTOR_FIELDS, updated_at=Field("version", max_length=64)))
+
+LOGIN = Schema({
+    "email": Field("email", required=True),
+    "password": Field("string", required=True),
+})
+
+ADMIN_CREATE = Schema({
+    "full_name": Field(required=True, max_length=100),
+    "email": Field("email", required=True, max_length=100),
+    "password": Field("string", required=True, min_length=6),
+    "role": Field("string", max_length=20),
+})
+
+AVAILABILITY_QUERY = Schema({
+    "day": Field("day", required=True),
+    "time": Field("time", required=True),
+    "until": Field("time"),
+    "specialty": Field(max_length=100),
+    "city": Field(max_length=100),
+    "limit": Field("integer"),
+})
+
+# ?id= lookups of the admin dashboard
+ID_QUERY = Schema({
+    "id": Field("integer", required=True),
+})
+
+IMPORT_QUERY = Schema({
+    "format": Field("string", choices=["csv", "ndjson"]),
+})